@@ -12,6 +12,8 @@ sys.modules["pyidml.exceptions"] = exceptions
 del sys
 
 from pyidml.api import Presentation  # noqa
+from pyidml.compare import diff  # noqa
+from pyidml.summary import peek  # noqa
 
 from pyidml.opc.constants import CONTENT_TYPE as CT  # noqa: E402
 from pyidml.opc.package import PartFactory  # noqa: E402
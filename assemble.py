@@ -0,0 +1,310 @@
+# encoding: utf-8
+
+"""Assembly of several IDML packages into one.
+
+The first package is the base: its preferences, tags, languages and other document
+settings are kept. Each further package contributes its spreads, stories and master
+spreads, appended in order, along with any swatches, styles, fonts and layers the
+base does not already have. Resources whose content is identical to one already
+present, compared by a hash of their canonical form without their own `Self` id
+and with references to resources already deduplicated remapped, are dropped and
+references to them resolve to the existing one.
+
+`Self` ids of the incoming package that collide with an id already in the assembly
+are renamed through a remap table computed up front, then every incoming part is
+rewritten in a single pass over its elements, so the cost is linear in document
+size however many ids collide.
+"""
+
+import copy
+import hashlib
+import posixpath
+import re
+
+from lxml import etree
+
+from pyidml.opc.packuri import PackURI
+from pyidml.opc.serialized import PartSource, iterevents, ns, parse_part, remap_refs
+
+DESIGNMAP_URI = PackURI("/designmap.xml")
+
+_IDPKG = "{%s}" % ns["idPkg"]["idPkg"]
+_UID = re.compile(r"u([0-9a-f]+)$")
+
+
+def assemble_packages(readers):
+    """Return new |PackageReader| assembled from sequence of `readers`.
+
+    None of `readers` is modified; the result is a clone of the first with the
+    content of the others merged in.
+    """
+    readers = list(readers)
+    if not readers:
+        raise ValueError("at least one package is required")
+    assembly = readers[0].clone()
+    assembler = _Assembler(assembly)
+    for reader in readers[1:]:
+        assembler.append(reader)
+    return assembly
+
+
+class _Assembler(object):
+    """Merges packages one at a time into `assembly`, a |PackageReader|."""
+
+    def __init__(self, assembly):
+        self._parts = assembly.parts
+        # ---trees edited across the whole merge must not be evicted meanwhile---
+        self._parts.pin(DESIGNMAP_URI)
+        self._designmap = self._parts[DESIGNMAP_URI]
+        self._ids = set()
+        self._last_uid = 0
+        with PartSource(assembly) as source:
+            manifest = source.manifest
+            for pack_uri in [DESIGNMAP_URI] + [uri for _, uri in manifest]:
+                self._add_ids(_iter_ids(source[pack_uri]))
+        self._masters = [uri for kind, uri in manifest if kind == "MasterSpread"]
+        for kind, uri in manifest:
+            if kind in ("Graphic", "Styles", "Fonts"):
+                self._parts.pin(uri)
+        self._resources = {
+            kind: self._parts[uri]
+            for kind, uri in manifest
+            if kind in ("Graphic", "Styles", "Fonts")
+        }
+        # ---content hash of each resource unit and master of the assembly, to its id---
+        self._hashes = {}
+        for unit in self._base_units():
+            self._hashes.setdefault(_content_hash(unit), _unit_id(unit))
+        self._font_families = {
+            f.get("Name"): f for f in self._resources["Fonts"].iter("FontFamily")
+        } if "Fonts" in self._resources else {}
+
+    def append(self, reader):
+        """Merge the spreads, stories and new resources of `reader`."""
+        trees = {DESIGNMAP_URI: parse_part(reader.parts.blob(DESIGNMAP_URI))}
+        manifest = PartSource(reader).manifest
+        for kind, pack_uri in manifest:
+            if kind in ("Graphic", "Styles", "Fonts", "MasterSpread", "Spread", "Story"):
+                trees[pack_uri] = parse_part(reader.parts.blob(pack_uri))
+
+        # ---split incoming resources into new ones and duplicates of existing ones---
+        dedup = {}
+        units = []
+        for container, unit in self._incoming_units(trees, manifest):
+            self._dedup(unit, dedup, units, container)
+        masters = []
+        for kind, uri in manifest:
+            if kind == "MasterSpread":
+                self._dedup(trees[uri], dedup, masters, uri)
+        spreads = [(uri, trees[uri]) for kind, uri in manifest if kind == "Spread"]
+        stories = [(uri, trees[uri]) for kind, uri in manifest if kind == "Story"]
+        sections = list(trees[DESIGNMAP_URI].iter("Section"))
+
+        # ---one remap table for every colliding id of everything being added---
+        remap = {old: new for old, new in dedup.items() if old != new}
+        incoming = [u for _, u in units] + [t for _, t in masters + spreads + stories]
+        for elm in incoming + sections:
+            for self_id in _iter_ids(elm):
+                if self_id in self._ids and self_id not in remap:
+                    remap[self_id] = self._new_id(self_id)
+        self._add_ids(remap.get(i, i) for elm in incoming + sections for i in _iter_ids(elm))
+
+        for elm in incoming + sections:
+            remap_refs(elm, remap)
+        renamed = {new: old for old, new in remap.items() if old not in dedup}
+        for container, unit in units:
+            self._rename(unit, renamed)
+            self._insert_unit(container, unit)
+
+        story_ids = []
+        for pack_uri, tree in stories:
+            story_id = next(_iter_ids(tree))
+            story_ids.append(story_id)
+            self._add_part("Story", "Stories/Story_%s.xml" % story_id, tree)
+        for pack_uri, tree in masters:
+            name = _renamed(pack_uri, remap)
+            self._add_part("MasterSpread", "MasterSpreads/%s" % name, tree)
+        for pack_uri, tree in spreads:
+            name = _renamed(pack_uri, remap)
+            self._add_part("Spread", "Spreads/%s" % name, tree)
+        for section in sections:
+            self._insert_after_last(section, self._designmap.find("Section"))
+
+        story_list = self._designmap.get("StoryList", "").split()
+        self._designmap.set("StoryList", " ".join(story_list + story_ids))
+
+    def _add_ids(self, ids):
+        """Record `ids` as taken, tracking the highest `u<hex>` id."""
+        for self_id in ids:
+            self._ids.add(self_id)
+            match = _UID.match(self_id)
+            if match:
+                self._last_uid = max(self._last_uid, int(match.group(1), 16))
+
+    def _add_part(self, kind, membername, tree):
+        """Add `tree` as part `membername` and reference it from the designmap."""
+        pack_uri = PackURI("/" + membername)
+        self._parts[pack_uri] = tree
+        ref = etree.Element(_IDPKG + kind, nsmap=ns["idPkg"])
+        ref.set("src", membername)
+        ref.tail = "\n\t"
+        refs = [e for e in self._designmap if e.tag == _IDPKG + kind]
+        if refs:
+            refs[-1].addnext(ref)
+        else:
+            self._designmap.append(ref)
+
+    def _base_units(self):
+        """Generate the resource units of the assembly that incoming ones dedupe on."""
+        for _, unit in self._units_of(self._resources, self._designmap):
+            yield unit
+        for pack_uri in self._masters:
+            yield self._parts[pack_uri]
+
+    def _dedup(self, unit, dedup, new, key):
+        """Map `unit` in `dedup` to an existing duplicate, or add `(key, unit)` to `new`.
+
+        `unit` is hashed with the references in `dedup` remapped, so a resource
+        differing only in referring to duplicates of existing ones is a duplicate too.
+        """
+        existing = self._hashes.get(_content_hash(unit, dedup))
+        if existing is None:
+            new.append((key, unit))
+        else:
+            dedup[_unit_id(unit)] = existing
+
+    def _incoming_units(self, trees, manifest):
+        """Generate `(container, unit)` pairs for the resources in `trees`.
+
+        `container` is the element of the assembly a new unit is to be added to.
+        """
+        resources = {
+            kind: trees[uri] for kind, uri in manifest if kind in ("Graphic", "Styles", "Fonts")
+        }
+        for parent, unit in self._units_of(resources, trees[DESIGNMAP_URI]):
+            if parent.tag == "Document":
+                yield self._designmap, unit
+            elif parent.tag.startswith("Root") and "Styles" in self._resources:
+                target = self._resources["Styles"].find(parent.tag)
+                yield (target if target is not None else self._resources["Styles"]), unit
+            elif parent.tag == _IDPKG + "Styles" and "Styles" in self._resources:
+                yield self._resources["Styles"], unit
+            elif parent.tag == _IDPKG + "Graphic" and "Graphic" in self._resources:
+                yield self._resources["Graphic"], unit
+            elif parent.tag == _IDPKG + "Fonts" and "Fonts" in self._resources:
+                yield self._resources["Fonts"], unit
+
+    def _insert_after_last(self, elm, sibling):
+        """Insert `elm` after the last element sharing `sibling`'s tag."""
+        if sibling is None:
+            return
+        same = [e for e in sibling.getparent() if e.tag == sibling.tag]
+        same[-1].addnext(elm)
+
+    def _insert_unit(self, container, unit):
+        """Add new resource `unit` to `container`, next to its own kind."""
+        if unit.tag == "FontFamily" and unit.get("Name") in self._font_families:
+            family = self._font_families[unit.get("Name")]
+            known = {f.get("Name") for f in family}
+            for font in unit:
+                if font.get("Name") not in known:
+                    family.append(font)
+            return
+        same = [e for e in container if e.tag == unit.tag]
+        if same:
+            same[-1].addnext(unit)
+        else:
+            container.append(unit)
+        if unit.tag == "FontFamily":
+            self._font_families[unit.get("Name")] = unit
+        self._hashes.setdefault(_content_hash(unit), unit.get("Self"))
+
+    def _new_id(self, self_id):
+        """Return an id not yet taken to replace colliding `self_id`."""
+        if _UID.match(self_id):
+            self._last_uid += 1
+            new_id = "u%x" % self._last_uid
+        else:
+            n = 2
+            while "%s %d" % (self_id, n) in self._ids:
+                n += 1
+            new_id = "%s %d" % (self_id, n)
+        self._ids.add(new_id)
+        return new_id
+
+    def _rename(self, unit, renamed):
+        """Keep the `Name` of a renamed named resource in step with its `Self`.
+
+        `renamed` maps each new id to the id it replaced.
+        """
+        for elm in unit.iter():
+            self_id, name = elm.get("Self"), elm.get("Name")
+            old = renamed.get(self_id)
+            if old is not None and name is not None and old.endswith("/" + name):
+                elm.set("Name", self_id[len(old) - len(name):])
+
+    @staticmethod
+    def _units_of(resources, designmap):
+        """Generate `(parent, unit)` pairs for the resource units of a document.
+
+        Units are the swatches and other direct children of Graphic.xml, the styles
+        and style groups in the root groups of Styles.xml, font families and the
+        layers of the designmap.
+        """
+        for kind in ("Graphic", "Fonts"):
+            if kind in resources:
+                for unit in resources[kind]:
+                    if unit.get("Self") is not None:
+                        yield resources[kind], unit
+        if "Styles" in resources:
+            for group in resources["Styles"]:
+                if group.tag.startswith("Root"):
+                    for unit in group:
+                        if unit.get("Self") is not None:
+                            yield group, unit
+                elif group.get("Self") is not None:
+                    yield resources["Styles"], group
+        for layer in designmap.iter("Layer"):
+            yield designmap, layer
+
+
+def _content_hash(elm, remap=None):
+    """Return digest of the canonical form of resource unit or part root `elm`.
+
+    The unit's own `Self` id and its tail are left out, so equal content under
+    different ids hashes equal. References are first remapped through `remap`,
+    leaving `elm` itself unchanged.
+    """
+    elm = copy.deepcopy(elm)
+    if remap:
+        remap_refs(elm, remap)
+    for unit in [elm] if elm.get("Self") is not None else list(elm):
+        unit.attrib.pop("Self", None)
+    return hashlib.sha1(etree.tostring(elm, method="c14n", with_tail=False)).digest()
+
+
+def _iter_ids(part):
+    """Generate the `Self` ids in `part`, an element or serialized bytes."""
+    streaming = isinstance(part, bytes)
+    for event, elm in iterevents(part, ("start", "end")):
+        if event == "start":
+            self_id = elm.get("Self")
+            if self_id is not None:
+                yield self_id
+        elif streaming:
+            elm.clear()
+
+
+def _unit_id(elm):
+    """Return `Self` id of resource unit `elm`, or of the element part root `elm` wraps."""
+    self_id = elm.get("Self")
+    if self_id is None and len(elm):
+        self_id = next((child.get("Self") for child in elm if child.get("Self")), None)
+    return self_id
+
+
+def _renamed(pack_uri, remap):
+    """Return member filename of `pack_uri` with the id it embeds remapped."""
+    stem, ext = posixpath.splitext(pack_uri.filename)
+    prefix, _, self_id = stem.partition("_")
+    return "%s_%s%s" % (prefix, remap.get(self_id, self_id), ext)
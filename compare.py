@@ -0,0 +1,173 @@
+# encoding: utf-8
+
+"""Structural comparison of two IDML packages.
+
+Members are first compared by CRC-32, read from the zip central directory when a
+package is given by path, so identical members are never inflated or parsed. Only
+members that differ are parsed, streaming, and compared element by element, keyed by
+the `Self` id of each element.
+"""
+
+import hashlib
+import zipfile
+import zlib
+
+from pyidml.opc.packuri import PackURI
+from pyidml.opc.serialized import PackageReader, PartSource, _is_xml_part, iterevents
+
+
+def diff(a, b):
+    """Return list of |Change| turning package `a` into package `b`.
+
+    `a` and `b` are each a |PackageReader| or the path or stream of an ``.idml``
+    file. Changes to XML members are reported per element having a `Self` id;
+    added, removed or changed members of any other kind are reported per member.
+    """
+    crcs_a, crcs_b = _member_crcs(a), _member_crcs(b)
+    changes = []
+    differing = []
+    for pack_uri in crcs_a:
+        if pack_uri not in crcs_b:
+            changes.append(Change("removed", pack_uri))
+        elif crcs_a[pack_uri] != crcs_b[pack_uri]:
+            if _is_xml_part(pack_uri):
+                differing.append(pack_uri)
+            else:
+                changes.append(Change("changed", pack_uri))
+    for pack_uri in crcs_b:
+        if pack_uri not in crcs_a:
+            changes.append(Change("added", pack_uri))
+
+    with PartSource(a) as source_a, PartSource(b) as source_b:
+        elms_a = _index_elements(source_a, differing)
+        elms_b = _index_elements(source_b, differing)
+
+    for self_id, old in elms_a.items():
+        new = elms_b.get(self_id)
+        if new is None:
+            changes.append(Change("removed", old.partname, self_id, old.tag))
+        elif old.digest != new.digest or old.partname != new.partname:
+            changes.append(_element_change(self_id, old, new))
+    for self_id, new in elms_b.items():
+        if self_id not in elms_a:
+            changes.append(Change("added", new.partname, self_id, new.tag))
+    return changes
+
+
+class Change(object):
+    """One difference between two packages.
+
+    `kind` is "added", "removed" or "changed". `self_id` and `tag` identify the
+    element, and are |None| for a change to a whole non-XML member. For a changed
+    element, `attributes` maps each attribute name that differs to its
+    `(old, new)` values, `text` is the `(old, new)` text of the element when it
+    differs and `partname` is the member holding the element in the new package.
+    """
+
+    def __init__(self, kind, partname, self_id=None, tag=None, attributes=None, text=None):
+        self.kind = kind
+        self.partname = partname
+        self.self_id = self_id
+        self.tag = tag
+        self.attributes = attributes or {}
+        self.text = text
+
+    def __repr__(self):
+        return "<Change %s %s %s%s>" % (
+            self.kind,
+            self.partname,
+            self.tag or "",
+            " %s" % self.self_id if self.self_id is not None else "",
+        )
+
+    @property
+    def moved(self):
+        """True when the change repositions a page item."""
+        return "ItemTransform" in self.attributes or "GeometricBounds" in self.attributes
+
+
+class _Element(object):
+    """Summary of an element having a `Self` id, as found in one package."""
+
+    __slots__ = ("partname", "tag", "attrib", "text", "digest")
+
+    def __init__(self, partname, tag, attrib, text, digest):
+        self.partname = partname
+        self.tag = tag
+        self.attrib = attrib
+        self.text = text
+        self.digest = digest
+
+
+def _element_change(self_id, old, new):
+    """Return "changed" |Change| for element `self_id` from summaries `old`, `new`."""
+    attributes = {}
+    for name in set(old.attrib) | set(new.attrib):
+        old_value, new_value = old.attrib.get(name), new.attrib.get(name)
+        if old_value != new_value:
+            attributes[name] = (old_value, new_value)
+    text = (old.text, new.text) if old.text != new.text else None
+    return Change("changed", new.partname, self_id, new.tag, attributes, text)
+
+
+def _index_elements(source, partnames):
+    """Return dict of `Self` id to |_Element| for the parts `partnames` of `source`.
+
+    Each element's digest covers its own attributes and everything below it that
+    does not belong to a nested element with its own `Self` id, so a change is
+    reported against the innermost identified element only. The text of an element
+    is the concatenated `Content` it owns, which for a story is the story text.
+    """
+    elements = {}
+    for partname in partnames:
+        part = source[partname]
+        streaming = isinstance(part, bytes)
+        stack = []
+        for event, elm in iterevents(part, ("start", "end")):
+            self_id = elm.get("Self")
+            if event == "start":
+                if self_id is not None:
+                    stack.append([self_id, elm.tag, dict(elm.attrib), [], hashlib.sha1()])
+                elif stack:
+                    stack[-1][4].update(repr((elm.tag, sorted(elm.attrib.items()))).encode("utf-8"))
+                continue
+
+            if stack and self_id is None and elm.text:
+                if elm.tag == "Content":
+                    stack[-1][3].append(elm.text)
+                    stack[-1][4].update(elm.text.encode("utf-8"))
+                elif elm.text.strip():
+                    stack[-1][4].update(elm.text.encode("utf-8"))
+            elif stack and self_id == stack[-1][0]:
+                self_id, tag, attrib, text, digest = stack.pop()
+                digest.update(repr(sorted(attrib.items())).encode("utf-8"))
+                elements[self_id] = _Element(
+                    partname, tag, attrib, "".join(text), digest.digest()
+                )
+            if streaming:
+                elm.clear()
+    return elements
+
+
+def _member_crcs(pkg):
+    """Return dict of partname to CRC-32 of each member of `pkg`.
+
+    For a path or stream the CRCs come from the zip central directory, without
+    reading any member. For a |PackageReader| a member it still holds compressed
+    keeps the CRC recorded in the package; the others are computed from the bytes
+    it holds, serializing only the parts it has parsed.
+    """
+    if isinstance(pkg, PackageReader):
+        return {pack_uri: _part_crc(pkg.parts, pack_uri) for pack_uri in pkg.parts}
+    with zipfile.ZipFile(pkg) as zipf:
+        return {PackURI("/" + info.filename): info.CRC for info in zipf.infolist()}
+
+
+def _part_crc(parts, pack_uri):
+    """Return CRC-32 of part `pack_uri` of `parts`, inflating nothing held compressed."""
+    member = parts.zip_member(pack_uri)
+    if member is not None:
+        return member.info.CRC
+    if parts.is_parsed(pack_uri):
+        return zlib.crc32(parts.blob(pack_uri))
+    return zlib.crc32(parts.view(pack_uri))
@@ -9,10 +9,12 @@ import collections
 try:
     Container = collections.abc.Container
     Mapping = collections.abc.Mapping
+    MutableMapping = collections.abc.MutableMapping
     Sequence = collections.abc.Sequence
 except AttributeError:
     Container = collections.Container
     Mapping = collections.Mapping
+    MutableMapping = collections.MutableMapping
     Sequence = collections.Sequence
 
 if sys.version_info >= (3, 0):
@@ -0,0 +1,270 @@
+# encoding: utf-8
+
+"""Persistent full-text index over a corpus of IDML files.
+
+The index lives in a single SQLite database. It maps each term to the paragraphs
+containing it, each paragraph being located by document, story id and paragraph
+number, and keeps the paragraph text so phrase queries can be confirmed without
+opening any IDML file.
+
+Updates are incremental. A document whose modification time is unchanged is
+skipped without being opened. Otherwise only the stories whose CRC-32 in the zip
+central directory changed are read again.
+"""
+
+import os
+import re
+import sqlite3
+import zipfile
+
+from pyidml.opc.packuri import PackURI
+from pyidml.opc.serialized import read_manifest
+from pyidml.text.storytext import iter_paragraphs
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS document (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS member (
+    document_id INTEGER NOT NULL,
+    partname TEXT NOT NULL,
+    crc INTEGER NOT NULL,
+    PRIMARY KEY (document_id, partname)
+);
+CREATE TABLE IF NOT EXISTS paragraph (
+    id INTEGER PRIMARY KEY,
+    document_id INTEGER NOT NULL,
+    partname TEXT NOT NULL,
+    story_id TEXT,
+    number INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS paragraph_member ON paragraph (document_id, partname);
+CREATE TABLE IF NOT EXISTS posting (
+    term TEXT NOT NULL,
+    paragraph_id INTEGER NOT NULL,
+    PRIMARY KEY (term, paragraph_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS posting_paragraph ON posting (paragraph_id);
+"""
+
+
+def tokenize(text):
+    """Return list of lowercased word tokens in `text`."""
+    return [t.lower() for t in _TOKEN.findall(text)]
+
+
+class Hit(object):
+    """One paragraph matching a query."""
+
+    def __init__(self, path, story_id, paragraph, text):
+        self.path = path
+        self.story_id = story_id
+        self.paragraph = paragraph
+        self.text = text
+
+    def __repr__(self):
+        return "<Hit %s %s #%d>" % (self.path, self.story_id, self.paragraph)
+
+
+class CorpusIndex(object):
+    """On-disk inverted index of the story text of many IDML files.
+
+    `path` is the SQLite database file, created when missing. Use as a context
+    manager, or call :meth:`close`, to release it.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if exc_type is not None:
+            self._db.rollback()
+        self.close()
+
+    def close(self):
+        """Commit pending changes and close the database."""
+        self._db.commit()
+        self._db.close()
+
+    def update(self, paths):
+        """Bring the index up to date for each IDML file in `paths`.
+
+        Returns the number of stories read. Files no longer present on disk are
+        dropped from the index.
+        """
+        count = 0
+        for path in paths:
+            path = os.path.abspath(path)
+            if os.path.exists(path):
+                count += self.add(path)
+            else:
+                self.remove(path)
+        self._db.commit()
+        return count
+
+    def add(self, path):
+        """Index the IDML file at `path`, reusing what is still current.
+
+        Returns the number of stories read. The document is indexed within a
+        savepoint and its modification time recorded last, so a file that fails to
+        index, e.g. a truncated zip, leaves the index as it was and is read again
+        by the next update.
+        """
+        path = os.path.abspath(path)
+        mtime = os.path.getmtime(path)
+        row = self._db.execute(
+            "SELECT id, mtime FROM document WHERE path = ?", (path,)
+        ).fetchone()
+        if row is not None and row[1] == mtime:
+            return 0
+        self._db.execute("SAVEPOINT add_document")
+        try:
+            count = self._add(path, row)
+            self._db.execute("UPDATE document SET mtime = ? WHERE path = ?", (mtime, path))
+        except BaseException:
+            self._db.execute("ROLLBACK TO add_document")
+            raise
+        finally:
+            self._db.execute("RELEASE add_document")
+        return count
+
+    def remove(self, path):
+        """Drop the IDML file at `path` from the index."""
+        path = os.path.abspath(path)
+        row = self._db.execute("SELECT id FROM document WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return
+        for (partname,) in self._db.execute(
+            "SELECT partname FROM member WHERE document_id = ?", (row[0],)
+        ).fetchall():
+            self._drop_member(row[0], partname)
+        self._db.execute("DELETE FROM document WHERE id = ?", (row[0],))
+
+    def search(self, query, limit=None):
+        """Return list of |Hit| for paragraphs matching `query`.
+
+        Every word of `query` must occur in a matching paragraph. Parts of `query`
+        in double quotes must also occur as a phrase, their words adjacent and in
+        order.
+        """
+        phrases = [tokenize(p) for p in re.findall(r'"([^"]*)"', query)]
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+
+        # ---intersect the postings of all terms, rarest first---
+        counts = {
+            t: self._db.execute("SELECT COUNT(*) FROM posting WHERE term = ?", (t,)).fetchone()[0]
+            for t in terms
+        }
+        terms.sort(key=counts.get)
+        sql = "SELECT paragraph_id FROM posting WHERE term = ?"
+        for _ in terms[1:]:
+            sql += " INTERSECT SELECT paragraph_id FROM posting WHERE term = ?"
+        sql = (
+            "SELECT d.path, p.story_id, p.number, p.text FROM paragraph p"
+            " JOIN document d ON d.id = p.document_id"
+            " WHERE p.id IN (%s) ORDER BY d.path, p.partname, p.number" % sql
+        )
+
+        hits = []
+        for path, story_id, number, text in self._db.execute(sql, terms):
+            tokens = tokenize(text)
+            if all(_contains_phrase(tokens, phrase) for phrase in phrases):
+                hits.append(Hit(path, story_id, number, text))
+                if limit is not None and len(hits) >= limit:
+                    break
+        return hits
+
+    def _add(self, path, row):
+        """Index the stories of `path` that changed; return the number read.
+
+        `row` is the document's `(id, mtime)` row, or |None| for a new document,
+        which is added with no modification time yet.
+        """
+        if row is None:
+            document_id = self._db.execute(
+                "INSERT INTO document (path, mtime) VALUES (?, -1)", (path,)
+            ).lastrowid
+        else:
+            document_id = row[0]
+
+        indexed = dict(
+            self._db.execute(
+                "SELECT partname, crc FROM member WHERE document_id = ?", (document_id,)
+            )
+        )
+        count = 0
+        with zipfile.ZipFile(path) as zipf:
+            crcs = {PackURI("/" + i.filename): i.CRC for i in zipf.infolist()}
+            stories = [
+                uri
+                for kind, uri in read_manifest(zipf.read("designmap.xml"))
+                if kind == "Story" and uri in crcs
+            ]
+            for partname in stories:
+                if indexed.pop(partname, None) == crcs[partname]:
+                    continue
+                self._drop_member(document_id, partname)
+                self._index_story(document_id, partname, zipf.read(partname.membername))
+                self._db.execute(
+                    "INSERT INTO member (document_id, partname, crc) VALUES (?, ?, ?)",
+                    (document_id, partname, crcs[partname]),
+                )
+                count += 1
+        for partname in indexed:
+            self._drop_member(document_id, partname)
+        return count
+
+    def _drop_member(self, document_id, partname):
+        """Remove paragraphs and postings indexed for one story member."""
+        self._db.execute(
+            "DELETE FROM posting WHERE paragraph_id IN"
+            " (SELECT id FROM paragraph WHERE document_id = ? AND partname = ?)",
+            (document_id, partname),
+        )
+        self._db.execute(
+            "DELETE FROM paragraph WHERE document_id = ? AND partname = ?",
+            (document_id, partname),
+        )
+        self._db.execute(
+            "DELETE FROM member WHERE document_id = ? AND partname = ?",
+            (document_id, partname),
+        )
+
+    def _index_story(self, document_id, partname, blob):
+        """Add paragraphs and postings for the story part `blob`."""
+        for story_id, number, text in iter_paragraphs(blob):
+            terms = set(tokenize(text))
+            if not terms:
+                continue
+            paragraph_id = self._db.execute(
+                "INSERT INTO paragraph (document_id, partname, story_id, number, text)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (document_id, partname, story_id, number, text),
+            ).lastrowid
+            self._db.executemany(
+                "INSERT INTO posting (term, paragraph_id) VALUES (?, ?)",
+                ((term, paragraph_id) for term in terms),
+            )
+
+
+def _contains_phrase(tokens, phrase):
+    """True when list `phrase` occurs as a contiguous run in list `tokens`."""
+    if not phrase:
+        return True
+    n = len(phrase)
+    first = phrase[0]
+    for i, token in enumerate(tokens):
+        if token == first and tokens[i:i + n] == phrase:
+            return True
+    return False
@@ -22,3 +22,23 @@ class InvalidXmlError(PythonPptxError):
     Raised when a value is encountered in the XML that is not valid according
     to the schema.
     """
+
+
+class ReadOnlyPackageError(PythonPptxError):
+    """
+    Raised on an attempt to change a package opened read-only.
+    """
+
+
+class InvalidPackageError(PythonPptxError):
+    """
+    Raised when parts of a package do not validate against the IDML schema.
+
+    `violations` holds the |SchemaViolation| instances found.
+    """
+
+    def __init__(self, violations):
+        super(InvalidPackageError, self).__init__(
+            "%d schema violation(s), first: %s" % (len(violations), violations[0])
+        )
+        self.violations = violations
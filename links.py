@@ -0,0 +1,241 @@
+# encoding: utf-8
+
+"""Index of placed-graphic links, link status checks and bulk relinking.
+
+A placed graphic is an `Image`, `PDF`, `EPS` or similar element inside a frame,
+whose `<Link>` child records the file it came from in `LinkResourceURI`, along
+with the size and modification time of the file when it was imported.
+|LinkIndex| gathers every link in one streaming pass over the spreads, master
+spreads and stories, where anchored graphics live. It then checks the linked files
+with concurrent `stat()` calls, since on network storage the latency of each call
+dominates. Relinking rewrites only the parts that hold an affected link.
+"""
+
+import datetime
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+from pyidml.opc.serialized import PartSource, iterevents, parse_part, serialize_part
+
+LINK_KINDS = ("MasterSpread", "Spread", "Story")
+
+OK = "ok"
+MISSING = "missing"
+MODIFIED = "modified"
+EMBEDDED = "embedded"
+UNCHECKED = "unchecked"
+
+_SPREAD_TAGS = frozenset(("Spread", "MasterSpread"))
+
+
+class PlacedLink(object):
+    """One placement of a linked file.
+
+    `partname` is the part holding the placement. `link_id`, `graphic_id` and
+    `frame_id` are the `Self` ids of the `<Link>`, of the graphic element holding
+    it and of the frame holding that.
+    """
+
+    def __init__(self, partname, link_id, graphic_id, frame_id, size, mtime, embedded):
+        self.partname = partname
+        self.link_id = link_id
+        self.graphic_id = graphic_id
+        self.frame_id = frame_id
+        self.size = size
+        self.mtime = mtime
+        self.embedded = embedded
+
+    def __repr__(self):
+        return "<PlacedLink %s in %s>" % (self.link_id, self.partname)
+
+
+class LinkIndex(object):
+    """Index of the placed-graphic links of `reader`, by URI.
+
+    `links` is a dict mapping each `LinkResourceURI` to the list of its
+    |PlacedLink| placements, in document order. Without `reader` the index starts
+    empty, for callers gathering placements with :func:`iter_links` themselves;
+    such an index can be checked but not relinked.
+    """
+
+    def __init__(self, reader=None):
+        self._reader = reader
+        self.links = {}
+        if reader is None:
+            return
+        with PartSource(reader) as source:
+            for partname in source.partnames(*LINK_KINDS):
+                if partname in source:
+                    self.add(partname, source[partname])
+
+    def add(self, partname, part):
+        """Add the links found in `part`, an element or bytes, to the index."""
+        for uri, placement in iter_links(partname, part):
+            self.links.setdefault(uri, []).append(placement)
+
+    def check(self, workers=16):
+        """Return dict mapping each URI to its status.
+
+        The status is one of `OK`, `MISSING`, `MODIFIED`, `EMBEDDED` when every
+        placement embeds the file, or `UNCHECKED` for URIs that are not local files.
+        A file is modified when its size, or its modification time to within two
+        seconds, differs from what a placement recorded at import. Files are checked by
+        `workers` threads.
+        """
+        status = {}
+        paths = {}
+        for uri, placements in self.links.items():
+            if all(p.embedded for p in placements):
+                status[uri] = EMBEDDED
+                continue
+            path = link_path(uri)
+            if path is None:
+                status[uri] = UNCHECKED
+            else:
+                paths[uri] = path
+        with ThreadPoolExecutor(workers) as executor:
+            stats = executor.map(_stat, paths.values())
+            for (uri, _), st in zip(paths.items(), stats):
+                status[uri] = self._status(self.links[uri], st)
+        return status
+
+    def missing(self, workers=16):
+        """Return sorted list of URIs whose linked file is missing."""
+        return sorted(uri for uri, s in self.check(workers).items() if s == MISSING)
+
+    def relink(self, mapping=None, prefix=None):
+        """Rewrite link URIs and return the number of `<Link>` elements changed.
+
+        `mapping` is a dict of old to new URI. `prefix` is an `(old, new)` pair, and
+        URIs starting with `old` get `new` in its place. When both are given, the
+        mapping is tried first. Only the parts holding an affected link are
+        rewritten; parts held as bytes are parsed for it and stored back as bytes.
+        """
+        renames = {}
+        for uri in self.links:
+            new = None
+            if mapping and uri in mapping:
+                new = mapping[uri]
+            elif prefix and uri.startswith(prefix[0]):
+                new = prefix[1] + uri[len(prefix[0]):]
+            if new is not None and new != uri:
+                renames[uri] = new
+        if not renames:
+            return 0
+
+        partnames = []
+        for uri in renames:
+            for placement in self.links[uri]:
+                if placement.partname not in partnames:
+                    partnames.append(placement.partname)
+
+        count = 0
+        for partname in partnames:
+            parsed = self._reader.parts.is_parsed(partname)
+            root = self._reader[partname] if parsed else parse_part(
+                self._reader.parts.view(partname)
+            )
+            for link in root.iter("Link"):
+                new = renames.get(link.get("LinkResourceURI"))
+                if new is not None:
+                    link.set("LinkResourceURI", new)
+                    count += 1
+            if not parsed:
+                self._reader[partname] = serialize_part(root)
+
+        for uri, new in renames.items():
+            self.links.setdefault(new, []).extend(self.links.pop(uri))
+        return count
+
+    @staticmethod
+    def _status(placements, st):
+        """Return status of a file with stat result `st` and list of `placements`.
+
+        The file counts as modified when it differs from what any placement recorded.
+        """
+        if st is None:
+            return MISSING
+        for placement in placements:
+            if placement.size is not None and placement.size != st.st_size:
+                return MODIFIED
+            if placement.mtime is not None and abs(placement.mtime - st.st_mtime) > 2:
+                return MODIFIED
+        return OK
+
+
+def iter_links(partname, part):
+    """Generate `(uri, placement)` for each `<Link>` of `part`, an element or bytes.
+
+    `placement` is the |PlacedLink| of the link found in part `partname`. Bytes
+    are read in one streaming pass, each story paragraph or top-level page item
+    being cleared once read.
+    """
+    streaming = isinstance(part, bytes)
+    for _, elm in iterevents(part):
+        tag = elm.tag
+        parent = elm.getparent()
+        if tag == "Link":
+            graphic = parent
+            frame = graphic.getparent() if graphic is not None else None
+            placement = PlacedLink(
+                partname,
+                elm.get("Self"),
+                graphic.get("Self") if graphic is not None else None,
+                frame.get("Self") if frame is not None else None,
+                _parse_size(elm.get("LinkResourceSize")),
+                _parse_time(elm.get("LinkImportModificationTime")),
+                elm.get("StoredState") == "Embedded",
+            )
+            yield elm.get("LinkResourceURI", ""), placement
+        elif streaming and (
+            tag == "ParagraphStyleRange" or parent is not None and parent.tag in _SPREAD_TAGS
+        ):
+            elm.clear()
+
+
+def link_path(uri):
+    """Return local filesystem path for link `uri`, or |None| if not a file URI."""
+    parsed = urlparse(uri)
+    if parsed.scheme != "file":
+        return None
+    path = unquote(parsed.path)
+    # ---"file:C:/dir/x.tif" style URIs written on Windows---
+    if parsed.netloc and not path:
+        path = parsed.netloc
+    return path
+
+
+def _parse_size(value):
+    """Return byte count from a `LinkResourceSize` like "0~1b3c", or |None|."""
+    if not value:
+        return None
+    high, _, low = value.partition("~")
+    try:
+        return (int(high, 16) << 32) + int(low, 16) if low else int(high, 16)
+    except ValueError:
+        return None
+
+
+def _parse_time(value):
+    """Return POSIX timestamp of a `LinkImportModificationTime`, or |None|.
+
+    The value is a local time without zone, like "2019-05-01T10:00:00".
+    """
+    if not value:
+        return None
+    try:
+        moment = datetime.datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        return None
+    return time.mktime(moment.timetuple())
+
+
+def _stat(path):
+    """Return `os.stat()` result for `path`, or |None| when it does not exist."""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
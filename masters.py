@@ -0,0 +1,259 @@
+# encoding: utf-8
+
+"""Resolution of the page items each page shows, its own and those of its master.
+
+A page names its master spread in `AppliedMaster` and places it with
+`MasterPageTransform`. The page shows the items of the matching master page,
+except those listed in its `OverrideList`, whose overridden copies live on the
+page's own spread. A master page may itself apply a master, so the chain is
+followed. Items are assigned to the page whose bounds contain their center, the
+way InDesign decides which page an item is on.
+
+Transforms are the six IDML `ItemTransform` numbers `a b c d tx ty`, mapping
+`(x, y)` to `(a*x + c*y + tx, b*x + d*y + ty)`. Pages and page items are read
+through the element classes of :mod:`pyidml.oxml.spread`, which parse and cache
+these attributes, so trees must come from a |PackageReader|.
+"""
+
+from lxml import etree
+
+from pyidml.opc.serialized import PartSource
+from pyidml.oxml.spread import IDENTITY, CT_Group  # noqa: F401
+
+# ---every attribute value the items of a master page are computed from, in order---
+_GEOMETRY = etree.XPath(
+    ".//@Self | .//@ItemTransform | .//@GeometricBounds | .//@Anchor", smart_strings=False
+)
+
+
+class ResolvedItem(object):
+    """A page item shown on a page.
+
+    `element` is the item's element. `transform` maps the item's inner coordinates
+    to the coordinates of the spread showing it, master placement included.
+    `master` is the `Self` id of the master spread the item comes from, or |None|
+    for the page's own items.
+    """
+
+    def __init__(self, element, transform, master=None):
+        self.element = element
+        self.transform = transform
+        self.master = master
+
+    def __repr__(self):
+        return "<ResolvedItem %s %s%s>" % (
+            self.element.tag,
+            self.element.get("Self"),
+            " from %s" % self.master if self.master else "",
+        )
+
+
+class MasterResolver(object):
+    """Resolves the effective page items of the pages of `reader`.
+
+    What each master page contributes is computed once and cached with the
+    attribute values it was computed from: ids, transforms, page bounds and path
+    anchors. A resolver works in passes. The first use of a master in a pass
+    compares those values with the master spread as it stands, a single XPath
+    query, and later uses in the pass take the cache as is. A pass starts with each
+    :meth:`iter_page_items` call or with :meth:`refresh`, so edits made to a master
+    spread's tree in place are seen from the next pass on. A replaced or reparsed
+    part is noticed at once. :meth:`invalidate` drops cached masters outright.
+    """
+
+    def __init__(self, reader):
+        self._reader = reader
+        with PartSource(reader) as source:
+            self._master_parts = {
+                _self_id(partname): partname for partname in source.partnames("MasterSpread")
+            }
+        self._cache = {}
+        self._checked = set()
+
+    def invalidate(self, master_id=None):
+        """Forget cached items of master spread `master_id`, or of all masters."""
+        if master_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(master_id, None)
+
+    def iter_page_items(self, pages):
+        """Generate `(page, items)` for each of `pages`, as :meth:`page_items`, in one pass."""
+        self.refresh()
+        for page in pages:
+            yield page, self.page_items(page)
+
+    def page_items(self, page):
+        """Return list of |ResolvedItem| shown on `page`, a `<Page>` of a spread.
+
+        Master items come first, from the outermost master in, followed by the
+        page's own items, in document order within each.
+        """
+        spread = page.getparent()
+        pages = spread.pages
+        index = pages.index(page)
+        items = []
+        if spread.get("ShowMasterItems", "true") != "false":
+            items.extend(self._inherited(page, page.item_transform))
+        for elm, slot in _assign(spread, pages):
+            if slot == index:
+                items.append(ResolvedItem(elm, elm.item_transform))
+        return items
+
+    def refresh(self):
+        """Start a new pass: recheck each cached master against its tree on next use."""
+        self._checked.clear()
+
+    def _inherited(self, page, page_to_spread, seen=()):
+        """Return |ResolvedItem| list contributed to `page` by its chain of masters.
+
+        `page_to_spread` maps the page's coordinates to those of the spread
+        showing it.
+        """
+        master_id = page.applied_master
+        if master_id is None or master_id in seen:
+            return []
+        master_pages = self._master_pages(master_id)
+        if not master_pages:
+            return []
+        master_page, own_items = master_pages[_master_slot(page, len(master_pages))]
+        overridden = set(page.override_list)
+        # ---master page coordinates, as placed on this page, to the showing spread---
+        placement = _compose(page_to_spread, page.master_page_transform)
+        items = self._inherited(master_page, placement, seen + (master_id,))
+        items = [item for item in items if item.element.get("Self") not in overridden]
+        items.extend(
+            ResolvedItem(elm, _compose(placement, transform), master_id)
+            for elm, transform in own_items
+            if elm.get("Self") not in overridden
+        )
+        return items
+
+    def _master_pages(self, master_id):
+        """Return list of `(page, [(item, transform)])`, one per page of the master.
+
+        Each transform maps the item's coordinates to those of its master page.
+        """
+        partname = self._master_parts.get(master_id)
+        if partname is None or partname not in self._reader:
+            return None
+        spread = self._reader[partname].find("MasterSpread")
+        cached = self._cache.get(master_id)
+        if cached is not None and cached[0] is spread and master_id in self._checked:
+            return cached[2]
+        geometry = _GEOMETRY(spread)
+        self._checked.add(master_id)
+        if cached is not None and cached[0] is spread and cached[1] == geometry:
+            return cached[2]
+
+        pages = spread.pages
+        master_pages = [(p, []) for p in pages]
+        for elm, slot in _assign(spread, pages):
+            if slot is not None:
+                page_transform = _invert(pages[slot].item_transform)
+                master_pages[slot][1].append((elm, _compose(page_transform, elm.item_transform)))
+        self._cache[master_id] = (spread, geometry, master_pages)
+        return master_pages
+
+
+def _apply(m, x, y):
+    """Return point `(x, y)` mapped through transform `m`."""
+    return m[0] * x + m[2] * y + m[4], m[1] * x + m[3] * y + m[5]
+
+
+def _assign(spread, pages):
+    """Generate `(item, index)` for each page item of `spread`.
+
+    `index` is that of the page in `pages` containing the item's center, or |None|
+    when the center is on the pasteboard.
+    """
+    rects = []
+    for page in pages:
+        top, left, bottom, right = page.geometric_bounds or (0.0, 0.0, 0.0, 0.0)
+        m = page.item_transform
+        xs, ys = zip(*(_apply(m, x, y) for x, y in ((left, top), (right, bottom))))
+        rects.append((min(xs), min(ys), max(xs), max(ys)))
+    for elm in spread.page_items:
+        bounds = _bounds(elm)
+        slot = None
+        if bounds is not None:
+            cx, cy = (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
+            for i, (x0, y0, x1, y1) in enumerate(rects):
+                if x0 <= cx <= x1 and y0 <= cy <= y1:
+                    slot = i
+                    break
+        yield elm, slot
+
+
+def _bounds(elm):
+    """Return `(x0, y0, x1, y1)` bounding box of page item `elm` in its parent's space.
+
+    Groups are bounded by their members. |None| when the item has no geometry.
+    """
+    m = elm.item_transform
+    points = [_apply(m, x, y) for x, y in elm.path_points]
+    for child in elm.page_items if isinstance(elm, CT_Group) else ():
+        child_bounds = _bounds(child)
+        if child_bounds is not None:
+            points.extend(
+                _apply(m, x, y)
+                for x in (child_bounds[0], child_bounds[2])
+                for y in (child_bounds[1], child_bounds[3])
+            )
+    if not points:
+        return None
+    xs, ys = zip(*points)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _compose(m1, m2):
+    """Return transform applying `m2` then `m1`."""
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return (
+        a1 * a2 + c1 * b2,
+        b1 * a2 + d1 * b2,
+        a1 * c2 + c1 * d2,
+        b1 * c2 + d1 * d2,
+        a1 * e2 + c1 * f2 + e1,
+        b1 * e2 + d1 * f2 + f1,
+    )
+
+
+def _invert(m):
+    """Return the inverse of transform `m`."""
+    a, b, c, d, e, f = m
+    det = a * d - b * c
+    return (
+        d / det,
+        -b / det,
+        -c / det,
+        a / det,
+        (c * f - d * e) / det,
+        (b * e - a * f) / det,
+    )
+
+
+def _master_slot(page, count):
+    """Return index of the master page applying to `page`, of `count` master pages.
+
+    Single-page masters apply to every page. On a spread with as many pages as the
+    master, each page takes the master page at its own position. Otherwise, e.g.
+    for the lone first page of a facing-pages document, a page right of the spine,
+    its center at a non-negative spread x, takes the last master page and a page
+    left of it the first.
+    """
+    if count == 1:
+        return 0
+    pages = page.getparent().pages
+    if len(pages) == count:
+        return pages.index(page)
+    top, left, bottom, right = page.geometric_bounds
+    x, _ = _apply(page.item_transform, (left + right) / 2, (top + bottom) / 2)
+    return count - 1 if x >= 0 else 0
+
+
+def _self_id(partname):
+    """Return the `Self` id embedded in a MasterSpreads/MasterSpread_<id>.xml name."""
+    return partname.filename.rsplit(".", 1)[0].partition("_")[2]
+
@@ -0,0 +1,230 @@
+# encoding: utf-8
+
+"""Data merge: one IDML per record, or per batch of records, from a template.
+
+Placeholders are written in story text as ``{{field}}``, or ``{{field@n}}`` to
+take the field from the n-th record when several records share a document. A
+placeholder must lie within a single character run.
+
+The template is prepared once. Each story holding placeholders is serialized with
+its placeholder text nodes replaced by markers and split into byte chunks around
+them. Every other member is compressed once. Merging a record then joins the chunks
+with the escaped field values and copies the precompressed members into the output
+zip, without parsing or compressing anything else. Documents can be written in a
+process pool, which receives the prepared template once per worker.
+"""
+
+import csv
+import io
+import json
+import re
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
+from pyidml.opc.packuri import PackURI
+from pyidml.opc.serialized import (
+    PackageReader,
+    PartSource,
+    _ZipMember,
+    _ZipPkgWriter,
+    parse_part,
+    serialize_part,
+)
+
+PLACEHOLDER = re.compile(r"\{\{(\w+)(?:@(\d+))?\}\}")
+
+# ---private-use characters standing in for placeholder text while serializing---
+_MARKER = re.compile("\ue000(\\d+)\ue001".encode("utf-8"))
+
+# ---documents sent to a worker per task, and tasks kept in flight per worker---
+_JOBS_PER_TASK = 16
+_TASKS_PER_WORKER = 2
+
+_template = None
+
+
+def merge_records(template, records, path_for, records_per_document=1, workers=None):
+    """Write merged documents for `records` and return the number written.
+
+    `template` is a |PackageReader| or the path of an ``.idml`` file. `records` is
+    an iterable of dicts, or a path accepted by :func:`read_records`. Each document
+    takes the next `records_per_document` records, the last one possibly fewer,
+    placeholders for missing records or fields becoming empty. The document numbered
+    `i`, counting from 0, is written to `path_for(i)`. With `workers` greater than 1
+    documents are written by that many processes, and `path_for` must return paths.
+    Records are read only as fast as the workers take them, so `records` may be a
+    stream of any length.
+    """
+    prepared = MergeTemplate(template)
+    if isinstance(records, str):
+        records = read_records(records)
+    jobs = (
+        (path_for(i), batch) for i, batch in enumerate(_batches(records, records_per_document))
+    )
+    count = 0
+    if workers and workers > 1:
+        pending = deque()
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(prepared,)) as ex:
+            for task in _batches(jobs, _JOBS_PER_TASK):
+                if len(pending) >= workers * _TASKS_PER_WORKER:
+                    count += pending.popleft().result()
+                pending.append(ex.submit(_merge_jobs, task))
+            while pending:
+                count += pending.popleft().result()
+    else:
+        for path, batch in jobs:
+            prepared.write(batch, path)
+            count += 1
+    return count
+
+
+def read_records(path):
+    """Generate record dicts from the CSV, JSON or JSON lines file at `path`.
+
+    A ``.csv`` file is read with its first row as field names. Otherwise the file
+    holds a JSON array of objects, or one JSON object per line.
+    """
+    if path.lower().endswith(".csv"):
+        with io.open(path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.DictReader(f):
+                yield row
+        return
+    with io.open(path, encoding="utf-8") as f:
+        head = f.read(1)
+        while head.isspace():
+            head = f.read(1)
+        if head == "[":
+            for record in json.loads(head + f.read()):
+                yield record
+            return
+        f.seek(0)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class MergeTemplate(object):
+    """A template package prepared for merging; picklable, to ship to workers.
+
+    `fields` is the sorted list of field names the template's placeholders use.
+    """
+
+    def __init__(self, template):
+        if not isinstance(template, PackageReader):
+            template = PackageReader(template)
+        self._members = []
+        self._stories = {}
+        fields = set()
+        with PartSource(template) as source:
+            manifest = dict((uri, kind) for kind, uri in source.manifest)
+        for partname in template.parts:
+            blob = template.parts.blob(partname)
+            story = None
+            if manifest.get(partname) == "Story":
+                story = self._prepare_story(blob)
+            if story is None:
+                compress_type = ZIP_STORED if partname == "/mimetype" else ZIP_DEFLATED
+                self._members.append(_ZipMember.pack(partname.membername, blob, compress_type))
+            else:
+                self._members.append(partname)
+                self._stories[partname] = story
+                for nodes in story[1]:
+                    fields.update(field for field, _ in nodes[1::2])
+        self.fields = sorted(fields)
+
+    def render_story(self, partname, records):
+        """Return serialized bytes of story `partname` merged with `records`."""
+        chunks, nodes = self._stories[partname]
+        out = [chunks[0]]
+        for node, chunk in zip(nodes, chunks[1:]):
+            text = []
+            for i, piece in enumerate(node):
+                if i % 2 == 0:
+                    text.append(piece)
+                    continue
+                field, slot = piece
+                record = records[slot] if slot < len(records) else {}
+                value = record.get(field)
+                text.append("" if value is None else str(value))
+            out.append(escape("".join(text)).encode("utf-8"))
+            out.append(chunk)
+        return b"".join(out)
+
+    def write(self, records, path):
+        """Write the document merged with list `records` to path or stream `path`."""
+        with _ZipPkgWriter(path) as writer:
+            for member in self._members:
+                if isinstance(member, _ZipMember):
+                    writer.write_member(PackURI("/" + member.info.filename), member)
+                else:
+                    writer.write(member, self.render_story(member, records))
+
+    @staticmethod
+    def _prepare_story(blob):
+        """Return `(chunks, nodes)` for story `blob`, or |None| if it has no placeholders.
+
+        `nodes` holds, for each `<Content>` with placeholders, its text as a list
+        alternating literal strings and `(field, slot)` pairs, `slot` counting
+        records from 0. `chunks` is the serialized story split around those nodes'
+        text, one more chunk than there are nodes. Raises |ValueError| for a
+        placeholder numbering a record below 1.
+        """
+        if b"{{" not in blob:
+            return None
+        if "\ue000".encode("utf-8") in blob:
+            raise ValueError("story uses U+E000, reserved for merge markers")
+        root = parse_part(blob)
+        nodes = []
+        for content in root.iter("Content"):
+            text = content.text or ""
+            pieces = PLACEHOLDER.split(text)
+            if len(pieces) == 1:
+                continue
+            node = []
+            for i in range(0, len(pieces), 3):
+                node.append(pieces[i])
+                if i + 1 < len(pieces):
+                    slot = int(pieces[i + 2] or 1) - 1
+                    if slot < 0:
+                        raise ValueError(
+                            "placeholder '{{%s@%s}}' must number records from 1"
+                            % (pieces[i + 1], pieces[i + 2])
+                        )
+                    node.append((pieces[i + 1], slot))
+            content.text = "\ue000%d\ue001" % len(nodes)
+            nodes.append(node)
+        if not nodes:
+            return None
+        chunks = _MARKER.split(serialize_part(root))[::2]
+        return chunks, nodes
+
+
+def _batches(records, size):
+    """Generate lists of up to `size` consecutive items of `records`."""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _init_worker(template):
+    """Keep the |MergeTemplate| shipped to this worker process for its jobs."""
+    global _template
+    _template = template
+
+
+def _merge_jobs(jobs):
+    """Write the merged documents of `(path, records)` pairs `jobs` in a worker process.
+
+    Returns the number of documents written.
+    """
+    for path, records in jobs:
+        _template.write(records, path)
+    return len(jobs)
@@ -0,0 +1,111 @@
+# encoding: utf-8
+
+"""Opt-in per-part timing and size statistics for reading and saving packages.
+
+Pass an |Instrumentation| to |PackageReader| to have it record, for each member,
+how many bytes were read and how long decompressing, parsing, serializing and
+compressing it took. Read the numbers afterwards from :meth:`Instrumentation.report`,
+or pass a `callback` to be told about each measurement as it happens, e.g. to feed
+a metrics system in production.
+"""
+
+import time
+
+clock = time.perf_counter
+
+
+class PartStats(object):
+    """Measurements accumulated for one package member.
+
+    Times are in seconds and add up over repeated operations, e.g. saving twice.
+    `bytes_read` is the compressed size of the member in the source archive and
+    `size` its uncompressed size as last read or serialized. `bytes_written` is its
+    compressed size in the last archive written.
+    """
+
+    _FIELDS = (
+        "bytes_read",
+        "size",
+        "decompress_time",
+        "parse_time",
+        "element_count",
+        "serialize_time",
+        "compress_time",
+        "bytes_written",
+    )
+
+    def __init__(self, partname):
+        self.partname = partname
+        for name in self._FIELDS:
+            setattr(self, name, 0)
+
+    def __repr__(self):
+        return "<PartStats %s %.3fs>" % (self.partname, self.total_time)
+
+    @property
+    def total_time(self):
+        """Seconds spent on this member over all stages."""
+        return self.decompress_time + self.parse_time + self.serialize_time + self.compress_time
+
+    def as_dict(self):
+        """Return dict of the measurements, suitable for JSON logging."""
+        stats = {name: getattr(self, name) for name in self._FIELDS}
+        stats["partname"] = str(self.partname)
+        stats["total_time"] = self.total_time
+        return stats
+
+
+class Instrumentation(object):
+    """Collects |PartStats| for the members of one or more packages.
+
+    `callback`, when given, is called as `callback(stage, stats)` after each
+    measurement, `stage` being one of "decompress", "parse", "serialize" or
+    "compress" and `stats` the |PartStats| of the member, already updated.
+    """
+
+    def __init__(self, callback=None):
+        self._callback = callback
+        self._parts = {}
+
+    def __getitem__(self, partname):
+        """|PartStats| recorded for `partname`, created empty on first access."""
+        stats = self._parts.get(partname)
+        if stats is None:
+            stats = self._parts[partname] = PartStats(partname)
+        return stats
+
+    def record(self, stage, partname, seconds, **counts):
+        """Add `seconds` to the `stage` time of `partname` and set the `counts` given."""
+        stats = self[partname]
+        setattr(stats, stage + "_time", getattr(stats, stage + "_time") + seconds)
+        for name, value in counts.items():
+            setattr(stats, name, value)
+        if self._callback is not None:
+            self._callback(stage, stats)
+
+    def report(self, key="total_time", limit=None):
+        """Return list of |PartStats|, largest `key` first, at most `limit` of them."""
+        parts = sorted(self._parts.values(), key=lambda s: getattr(s, key), reverse=True)
+        return parts if limit is None else parts[:limit]
+
+    def format(self, limit=20):
+        """Return the :meth:`report` as a plain-text table, one member per line."""
+        lines = [
+            "%-40s %10s %10s %8s %8s %8s %8s %8s"
+            % ("member", "read", "size", "elements", "unzip", "parse", "serial", "zip")
+        ]
+        for s in self.report(limit=limit):
+            lines.append(
+                "%-40s %10d %10d %8d %8.3f %8.3f %8.3f %8.3f"
+                % (
+                    s.partname.membername,
+                    s.bytes_read,
+                    s.size,
+                    s.element_count,
+                    s.decompress_time,
+                    s.parse_time,
+                    s.serialize_time,
+                    s.compress_time,
+                )
+            )
+        return "\n".join(lines)
@@ -0,0 +1,102 @@
+# encoding: utf-8
+
+"""Undo journal for edits made to the parts of a |PackageReader| in a transaction.
+
+lxml reports no changes made to a tree, so edits to be undone must be made
+through a |Journal|, which applies each one and records how to reverse it. An
+entry is a short tuple naming the operation, the element concerned and what it
+replaces: an attribute's old value, an element's old position, or the part's old
+value when a whole part is replaced. No part is ever copied. Rolling back replays
+the entries in reverse.
+"""
+
+
+class Journal(object):
+    """Applies edits to element trees and records what is needed to undo them.
+
+    Elements removed are kept alive by the journal until it is discarded, so they
+    can be put back where they were.
+    """
+
+    def __init__(self):
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def append(self, parent, child):
+        """Append `child` to `parent`, moving it if it is already in a tree."""
+        self.insert(parent, len(parent), child)
+
+    def insert(self, parent, index, child):
+        """Insert `child` in `parent` at `index`, moving it if it is already in a tree."""
+        if child.getparent() is not None:
+            self.remove(child)
+        parent.insert(index, child)
+        self._entries.append(("insert", child))
+
+    def remove(self, child):
+        """Remove `child`, with its tail, from its parent."""
+        parent = child.getparent()
+        self._entries.append(("remove", child, parent, parent.index(child)))
+        parent.remove(child)
+
+    def set(self, elm, name, value):
+        """Set attribute `name` of `elm` to `value`, or delete it when `value` is |None|."""
+        old = elm.get(name)
+        if value is None:
+            if old is not None:
+                # ---keep the attribute's position, to put it back in order---
+                self._entries.append(("unset", elm, name, old, list(elm.attrib).index(name)))
+                del elm.attrib[name]
+            return
+        self._entries.append(("attr", elm, name, old))
+        elm.set(name, value)
+
+    def set_tail(self, elm, tail):
+        """Set the text following `elm` to `tail`."""
+        self._entries.append(("tail", elm, elm.tail))
+        elm.tail = tail
+
+    def set_text(self, elm, text):
+        """Set the text of `elm` to `text`."""
+        self._entries.append(("text", elm, elm.text))
+        elm.text = text
+
+    def record_part(self, parts, pack_uri):
+        """Record how part `pack_uri` is held in `parts`, before it is replaced.
+
+        Rolling back puts the part back as it was held, with its dirty state.
+        """
+        self._entries.append(("part", parts, pack_uri, parts.record(pack_uri)))
+
+    def rollback(self, mark=0):
+        """Undo the edits recorded after the first `mark` ones, most recent first."""
+        while len(self._entries) > mark:
+            entry = self._entries.pop()
+            op = entry[0]
+            if op == "attr":
+                _, elm, name, value = entry
+                if value is None:
+                    del elm.attrib[name]
+                else:
+                    elm.set(name, value)
+            elif op == "unset":
+                _, elm, name, value, index = entry
+                attrs = list(elm.attrib.items())
+                attrs.insert(index, (name, value))
+                elm.attrib.clear()
+                elm.attrib.update(attrs)
+            elif op == "text":
+                entry[1].text = entry[2]
+            elif op == "tail":
+                entry[1].tail = entry[2]
+            elif op == "insert":
+                child = entry[1]
+                child.getparent().remove(child)
+            elif op == "remove":
+                _, child, parent, index = entry
+                parent.insert(index, child)
+            elif op == "part":
+                _, parts, pack_uri, record = entry
+                parts.restore(pack_uri, record)
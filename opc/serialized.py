@@ -2,13 +2,28 @@
 
 """API for reading/writing serialized Open Packaging Convention (OPC) package."""
 
+import asyncio
+import contextlib
+import copy
+import fnmatch
+import functools
 import os
 import posixpath
+import struct
+import sys
+import threading
+import time
 import zipfile
+import zlib
 
-from pyidml.compat import Container, is_string
-from pyidml.exceptions import PackageNotFoundError
+from collections import OrderedDict
+from io import BytesIO
+
+from pyidml.compat import Container, MutableMapping, is_string
+from pyidml.exceptions import PackageNotFoundError, ReadOnlyPackageError
 from pyidml.opc.constants import CONTENT_TYPE as CT
+from pyidml.opc.instrument import clock
+from pyidml.opc.journal import Journal
 from pyidml.opc.oxml import CT_Types, serialize_part_xml
 from pyidml.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI, PackURI
 from pyidml.opc.shared import CaseInsensitiveDict
@@ -26,41 +41,770 @@ ns = {
     "stEvt": {"stEvt": "http://ns.adobe.com/xap/1.0/sType/ResourceEvent#"}
 }
 
+
+def iterevents(part, events=("end",)):
+    """Generate `(event, element)` pairs for `part` in document order.
+
+    `part` is either a parsed element or the serialized XML bytes of a package part.
+    Bytes are parsed incrementally so a caller can `.clear()` elements it is done
+    with and keep memory flat; an element is walked in place and must not be
+    cleared by the caller.
+    """
+    if isinstance(part, etree._Element):
+        return etree.iterwalk(part, events=events)
+    return etree.iterparse(BytesIO(part), events=events, resolve_entities=False)
+
+
+def read_manifest(designmap):
+    """Return list of `(kind, partname)` pairs referenced by `designmap`.
+
+    `kind` is the local name of the `idPkg:*` reference element, e.g. "Story" or
+    "Spread", and `partname` is the |PackURI| of the referenced part, in the order
+    the designmap lists them.
+    """
+    idpkg = "{%s}" % ns["idPkg"]["idPkg"]
+    manifest = []
+    for _, elm in iterevents(designmap):
+        if elm.tag.startswith(idpkg) and "src" in elm.attrib:
+            manifest.append((elm.tag[len(idpkg):], PackURI("/" + elm.attrib["src"])))
+    return manifest
+
+
+def remap_refs(root, remap):
+    """Replace every id reference found in `remap` throughout `root`, in one pass.
+
+    Attribute values are matched whole and, for space-separated lists, token by
+    token; element text is matched for `type="object"` properties.
+    """
+    if not remap:
+        return
+    for elm in root.iter():
+        attrib = elm.attrib
+        for key, value in attrib.items():
+            if value in remap:
+                attrib[key] = remap[value]
+            elif " " in value:
+                tokens = value.split(" ")
+                if any(t in remap for t in tokens):
+                    attrib[key] = " ".join(remap.get(t, t) for t in tokens)
+        if elm.text in remap and attrib.get("type") == "object":
+            elm.text = remap[elm.text]
+
+
+class PartSource(Container):
+    """Read-only access to the parts of an IDML package without building a reader.
+
+    `pkg` is a |PackageReader|, in which case its parts are served as they are
+    without parsing those it has not parsed yet, or
+    the path or stream of an ``.idml`` zip, in which case each member is read from
+    the archive only when asked for and returned as bytes. Use as a context manager
+    so the archive gets closed.
+    """
+
+    def __init__(self, pkg):
+        self._pkg = pkg
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def __contains__(self, pack_uri):
+        """Return True when part identified by `pack_uri` is present in package."""
+        if isinstance(self._pkg, PackageReader):
+            return pack_uri in self._pkg
+        return pack_uri.membername in self._zipf.NameToInfo
+
+    def __getitem__(self, pack_uri):
+        """Return element or bytes of part corresponding to `pack_uri`."""
+        if isinstance(self._pkg, PackageReader):
+            return self._pkg.parts.view(pack_uri)
+        try:
+            return self._zipf.read(pack_uri.membername)
+        except KeyError:
+            raise KeyError("no member '%s' in package" % pack_uri)
+
+    def close(self):
+        """Close the underlying archive, if one was opened."""
+        if "_zipf" in self.__dict__:
+            self._zipf.close()
+
+    @lazyproperty
+    def manifest(self):
+        """List of `(kind, partname)` pairs listed by the designmap."""
+        return read_manifest(self[PackURI("/designmap.xml")])
+
+    def partnames(self, *kinds):
+        """Return partnames listed in the designmap having one of `kinds`."""
+        return [partname for kind, partname in self.manifest if kind in kinds]
+
+    @lazyproperty
+    def _zipf(self):
+        """`ZipFile` instance open for reading."""
+        return zipfile.ZipFile(self._pkg, "r")
+
+
 class PackageReader(Container):
     """Provides access to package-parts of an OPC package with dict semantics.
 
     The package may be in zip-format (a .pptx file) or expanded into a directory
     structure, perhaps by unzipping a .pptx file.
+
+    XML parts are parsed the first time they are accessed; parts never accessed are
+    written back on save byte-for-byte as they were read.
+
+    `instrumentation` is an optional |Instrumentation| recording per-part sizes and
+    the time spent decompressing, parsing, serializing and compressing each part.
+
+    `cache_size`, when given, bounds the memory taken by parsed trees to about that
+    many bytes. Least recently used parts are then serialized back to bytes and
+    parsed again on next access, so edits made in place survive eviction. Parts
+    replaced through the reader stay resident until saved, as do all parts while a
+    :meth:`transaction` is open, parts passed to `parts.pin()` and parts whose root
+    element a caller still holds. Elements below the root must not be held on to
+    across accesses to other parts in that mode, since the part may be evicted and
+    reparsed in between; fetch the part from the reader again, or pin it, instead.
+
+    `include` and `exclude` are sequences of glob patterns matched against member
+    names, e.g. ``"Stories/*"``. A member not matching `include`, when given, or
+    matching `exclude` is kept as its compressed bytes: it is only inflated if
+    accessed, and otherwise copied into the saved package as is, without being
+    decompressed or compressed again.
     """
 
-    def __init__(self, pkg_file):
+    def __init__(
+        self, pkg_file, instrumentation=None, cache_size=None, include=None, exclude=None
+    ):
         self._pkg_file = pkg_file
-        self.parts: dict = _ZipPkgReader(self._pkg_file)._blobs()
-        # print(self.parts.keys())
-        self.graphic = _graphic_item(self.parts)
-        self.root = _designmap_item(self.parts)
+        self.instrumentation = instrumentation
+        blobs = _ZipPkgReader(self._pkg_file)._blobs(instrumentation, include, exclude)
+        if cache_size is None:
+            self.parts = _PartDict(blobs, instrumentation)
+        else:
+            self.parts = _BoundedPartDict(blobs, cache_size, instrumentation)
 
     def __contains__(self, pack_uri):
         """Return True when part identified by `pack_uri` is present in package."""
         return pack_uri in self.parts
 
+    @classmethod
+    def from_parts(cls, pkg_file, parts, instrumentation=None, mapping=None):
+        """Return a |PackageReader| over `parts`, a prepared |_PartDict|.
+
+        `pkg_file` is where :meth:`save` writes by default, |None| to require a
+        path. `mapping`, when given, is the memory map the parts are read from;
+        the reader takes it over and releases it on :meth:`close`.
+        """
+        reader = cls.__new__(cls)
+        reader._pkg_file = pkg_file
+        reader.instrumentation = instrumentation
+        reader.parts = parts
+        if mapping is not None:
+            reader._mapping = mapping
+        return reader
+
+    @classmethod
+    async def aopen(cls, pkg_file, executor=None, **kwargs):
+        """Return a reader for `pkg_file`, reading the archive in `executor`.
+
+        `executor` defaults to the event loop's default thread pool. `kwargs` are
+        passed on to the constructor, so `await FrozenPackageReader.aopen(path)`
+        works as well.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(cls, pkg_file, **kwargs))
+
+    async def asave(self, path='', executor=None, **kwargs):
+        """Save the package as :meth:`save` does, serializing and writing in `executor`.
+
+        The reader must not be changed by other tasks until the save completes.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, functools.partial(self.save, path, **kwargs))
+
     def __getitem__(self, pack_uri) ->etree._Element:
         """Return bytes for part corresponding to `pack_uri`."""
         return self.parts[pack_uri]
 
     def __setitem__(self, pack_uri, content):
         """Return bytes for part corresponding to `pack_uri`."""
+        journal = self.__dict__.get("_journal")
+        if journal is not None:
+            journal.record_part(self.parts, pack_uri)
         self.parts[pack_uri] = content
 
-    def save(self, path=''):
+    @lazyproperty
+    def graphic(self):
+        """|_graphic_item| giving access to the colors of Resources/Graphic.xml."""
+        return _graphic_item(self.parts)
+
+    @lazyproperty
+    def root(self):
+        """|_designmap_item| wrapping designmap.xml."""
+        return _designmap_item(self.parts)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Context manager undoing the edits made within it if it exits by an exception.
+
+        It yields a |Journal|, through which tree edits must be made to be undone:
+        `journal.set(elm, name, value)`, `journal.insert(parent, index, child)`,
+        `journal.remove(child)` and so on. Parts replaced through the reader are
+        journaled too. Transactions nest; an inner one rolled back undoes only its
+        own edits. The exception is re-raised after rolling back.
+        """
+        outer = self.__dict__.get("_journal")
+        journal = outer if outer is not None else Journal()
+        mark = len(journal)
+        self._journal = journal
+        try:
+            with self.parts.hold():
+                try:
+                    yield journal
+                except BaseException:
+                    journal.rollback(mark)
+                    raise
+        finally:
+            if outer is None:
+                self._journal = None
+
+    def clone(self):
+        """Return a new |PackageReader| sharing the unmodified parts of this one.
+
+        The serialized bytes of parts are shared between this reader and the clone
+        and each side parses its own tree only when it first accesses a part, so
+        editing a part of the clone never affects this reader and vice versa. Parts
+        this reader has already parsed are copied into the clone as they stand,
+        since they may carry edits. Cloning a freshly opened template therefore
+        costs one dict copy.
+        """
+        return PackageReader.from_parts(self._pkg_file, self.parts.copy(), self.instrumentation)
+
+    def close(self):
+        """Release the memory map this reader's parts are read from, if any.
+
+        Parts neither accessed nor saved by then, in this reader or its clones, can
+        no longer be read. Readers opened from a package file hold nothing to release.
+        """
+        mapping = self.__dict__.pop("_mapping", None)
+        if mapping is not None:
+            mapping.close()
+
+    def save(self, path='', minify=False, sort_attributes=False, schemas=None):
+        """Write the package to `path`, by default the file it was read from.
+
+        With `minify`, whitespace-only text between elements is dropped from XML
+        parts, leaving the text of `<Content>` elements as it is. With
+        `sort_attributes`, attributes are written in name order so equal trees
+        always serialize to equal bytes. Either option rewrites every XML part,
+        including unparsed ones, and edits parsed trees in place.
+
+        `schemas`, a |SchemaSet|, has the parts that may have changed since they
+        were read or last saved validated first; |InvalidPackageError| is raised,
+        and nothing written, when any of them is invalid.
+        """
         if path=='':
             path=self._pkg_file
-        _save = _ZipPkgWriter(path)
-        for file in self.parts:
-            if not type(self.parts[file])==etree._Element:
-                _save.write(file, self.parts[file])
-            else:
-                _save.write(file, etree.tostring(self.parts[file], standalone=True, encoding='UTF-8', doctype=self.parts[file].tail, with_tail=False))
+        if schemas is not None:
+            schemas.check(self, [file for file in self.parts if self.parts.is_dirty(file)])
+        normalize = minify or sort_attributes
+        with _ZipPkgWriter(path, self.instrumentation) as _save:
+            for file in self.parts:
+                member = self.parts.zip_member(file)
+                if member is not None and not (normalize and _is_xml_part(file)):
+                    _save.write_member(file, member)
+                    continue
+                blob = self.parts.blob(file, minify, sort_attributes)
+                _save.write(file, blob)
+                self.parts.mark_saved(file, blob)
+
+
+class FrozenPackageReader(PackageReader):
+    """Read-only |PackageReader| that may be shared between threads.
+
+    Parts are still parsed lazily, each under its own lock so that concurrent first
+    accesses parse it once while other parts are parsed in parallel. Adding,
+    replacing or removing parts raises |ReadOnlyPackageError|. The parsed trees are
+    shared by all threads and must be treated as read-only too; call :meth:`clone`
+    for a private, editable |PackageReader|, which costs one dict copy since it
+    starts from the bytes read from the package.
+
+    `include` and `exclude` are as for |PackageReader|; members left compressed are
+    inflated under the part's lock on first access. There is no `cache_size`, since
+    trees shared between threads cannot be evicted safely.
+    """
+
+    def __init__(self, pkg_file, instrumentation=None, include=None, exclude=None):
+        self._pkg_file = pkg_file
+        self.instrumentation = instrumentation
+        self.parts = _FrozenPartDict(
+            _ZipPkgReader(self._pkg_file)._blobs(instrumentation, include, exclude),
+            instrumentation,
+        )
+        self._lock = threading.Lock()
+
+    def __setitem__(self, pack_uri, content):
+        raise ReadOnlyPackageError("package is read-only, clone() it to make changes")
+
+    def transaction(self):
+        raise ReadOnlyPackageError("package is read-only, clone() it to make changes")
+
+    @property
+    def graphic(self):
+        """|_graphic_item| over the shared Graphic.xml tree; read its colors only."""
+        with self._lock:
+            if "_graphic" not in self.__dict__:
+                self.__dict__["_graphic"] = _graphic_item(self.parts)
+        return self.__dict__["_graphic"]
+
+    @property
+    def root(self):
+        """|_designmap_item| wrapping the shared designmap.xml tree."""
+        with self._lock:
+            if "_root" not in self.__dict__:
+                self.__dict__["_root"] = _designmap_item(self.parts)
+        return self.__dict__["_root"]
+
+    def clone(self):
+        """Return a new, editable |PackageReader| starting from this package's bytes."""
+        return PackageReader.from_parts(self._pkg_file, self.parts.copy(), self.instrumentation)
+
+
+class _PartDict(MutableMapping):
+    """dict mapping partname to part, parsing XML parts on first access.
+
+    Each value is held either as the serialized bytes read from the package, which
+    are never mutated and so may be shared between readers, or as the element
+    parsed from them, which belongs to this mapping alone.
+    """
+
+    def __init__(self, items, instrumentation=None):
+        self._items = items
+        self._instrumentation = instrumentation
+        self._replaced = set()
+
+    def __contains__(self, pack_uri):
+        return pack_uri in self._items
+
+    def __delitem__(self, pack_uri):
+        del self._items[pack_uri]
+        self._replaced.discard(pack_uri)
+
+    def __getitem__(self, pack_uri):
+        """Return element of XML part `pack_uri`, parsing it if needed, else bytes."""
+        part = self._inflated(pack_uri)
+        if isinstance(part, bytes) and _is_xml_part(pack_uri):
+            part = self._items[pack_uri] = self._parse(pack_uri, part)
+        return part
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __setitem__(self, pack_uri, part):
+        self._items[pack_uri] = part
+        self._replaced.add(pack_uri)
+
+    def blob(self, pack_uri, minify=False, sort_attributes=False):
+        """Return serialized bytes of `pack_uri`, serializing it if it was parsed.
+
+        `minify` and `sort_attributes` are as for :func:`normalize_part`; when either
+        is set an unparsed XML part is parsed into a throwaway tree to apply them.
+        """
+        part = self._inflated(pack_uri)
+        if (minify or sort_attributes) and isinstance(part, bytes) and _is_xml_part(pack_uri):
+            part = self._parse(pack_uri, part)
+        if not isinstance(part, etree._Element):
+            return part
+        if self._instrumentation is None:
+            if minify or sort_attributes:
+                normalize_part(part, minify, sort_attributes)
+            return serialize_part(part)
+        start = clock()
+        if minify or sort_attributes:
+            normalize_part(part, minify, sort_attributes)
+        blob = serialize_part(part)
+        self._instrumentation.record("serialize", pack_uri, clock() - start, size=len(blob))
+        return blob
+
+    def copy(self):
+        """Return a |_PartDict| sharing blobs with this one and copying parsed parts."""
+        clone = _PartDict(
+            {
+                pack_uri: copy.deepcopy(part) if isinstance(part, etree._Element) else part
+                for pack_uri, part in self._items.items()
+            },
+            self._instrumentation,
+        )
+        clone._replaced = set(self._replaced)
+        return clone
+
+    def is_dirty(self, pack_uri):
+        """True when `pack_uri` may differ from what was read or last saved.
+
+        That is when it was replaced, or is held parsed and so may have been edited.
+        """
+        return pack_uri in self._replaced or self.is_parsed(pack_uri)
+
+    @contextlib.contextmanager
+    def hold(self):
+        """Context manager keeping parsed parts resident within it; see |_BoundedPartDict|."""
+        yield
+
+    def is_parsed(self, pack_uri):
+        """True when `pack_uri` is currently held as a parsed element."""
+        return isinstance(self._items[pack_uri], etree._Element)
+
+    def mark_dirty(self, pack_uri):
+        """Note that parsed part `pack_uri` was changed; see |_BoundedPartDict|."""
+
+    def mark_saved(self, pack_uri, blob):
+        """Note that part `pack_uri` was just written out as `blob`."""
+        self._replaced.discard(pack_uri)
+
+    def pin(self, pack_uri):
+        """Keep part `pack_uri`, once parsed, resident; see |_BoundedPartDict|."""
+
+    def record(self, pack_uri):
+        """Return how part `pack_uri` is held, for :meth:`restore`; |None| when absent.
+
+        The value is taken as it stands, compressed or not, with whether it counts
+        as replaced, so restoring it neither inflates it nor makes it dirty.
+        """
+        if pack_uri not in self._items:
+            return None
+        return (self._items[pack_uri], pack_uri in self._replaced)
+
+    def restore(self, pack_uri, record):
+        """Put part `pack_uri` back as :meth:`record` found it, removing it for |None|."""
+        if record is None:
+            self._items.pop(pack_uri, None)
+            self._replaced.discard(pack_uri)
+            return
+        self._items[pack_uri], replaced = record[:2]
+        if replaced:
+            self._replaced.add(pack_uri)
+        else:
+            self._replaced.discard(pack_uri)
+
+    def view(self, pack_uri):
+        """Return element of `pack_uri` if already parsed, otherwise its bytes.
+
+        Unlike item access this never parses, for callers that only read a part
+        and can stream over its bytes.
+        """
+        return self._inflated(pack_uri)
+
+    def zip_member(self, pack_uri):
+        """Return |_ZipMember| of `pack_uri` if it is still held compressed, else |None|."""
+        part = self._items[pack_uri]
+        return part if isinstance(part, _ZipMember) else None
+
+    def _inflated(self, pack_uri):
+        """Return part `pack_uri`, first inflating it in place if held compressed."""
+        part = self._items[pack_uri]
+        if not isinstance(part, (_ZipMember, _MappedMember)):
+            return part
+        if self._instrumentation is None:
+            part = self._items[pack_uri] = part.inflate()
+            return part
+        start = clock()
+        part = self._items[pack_uri] = part.inflate()
+        self._instrumentation.record("decompress", pack_uri, clock() - start)
+        return part
+
+    def _parse(self, pack_uri, blob):
+        """Return element parsed from `blob`, recording parse statistics if enabled."""
+        if self._instrumentation is None:
+            return parse_part(blob)
+        start = clock()
+        elm = parse_part(blob)
+        seconds = clock() - start
+        self._instrumentation.record(
+            "parse", pack_uri, seconds, element_count=sum(1 for _ in elm.iter())
+        )
+        return elm
+
+
+class _BoundedPartDict(_PartDict):
+    """|_PartDict| keeping parsed trees within about `limit` bytes of memory.
+
+    The memory a tree takes is estimated from the size of the bytes it was parsed
+    from. When the estimate for all resident trees exceeds `limit`, the least
+    recently accessed ones are serialized and replaced by their bytes. Nothing is
+    serialized on parse or save; eviction serializes each tree once, and since the
+    tree may have been edited in place, the result is kept rather than the bytes it
+    was parsed from. When the two differ the part counts as replaced, so
+    :meth:`is_dirty` still reports it. Trees set whole or passed to
+    :meth:`mark_dirty` or :meth:`pin` stay resident, as does every tree while
+    :meth:`hold` is in effect. So does a tree whose root element is referenced from
+    outside this mapping, since edits to a root its caller kept would otherwise be
+    lost. A caller keeping only elements below the root must :meth:`pin` the part.
+    """
+
+    # ---an lxml tree takes roughly this many times the size of its XML---
+    _TREE_FACTOR = 8
+
+    # ---estimated memory per element of a tree set whole, not parsed from bytes---
+    _ELEMENT_WEIGHT = 1024
+
+    # ---references to a root in _shrink(): the mapping, a local and getrefcount's---
+    _OWN_REFS = 3
+
+    def __init__(self, items, limit, instrumentation=None):
+        super(_BoundedPartDict, self).__init__(items, instrumentation)
+        self._limit = limit
+        self._resident = OrderedDict()
+        self._size = 0
+        self._dirty = set()
+        self._pinned = set()
+        self._holds = 0
+
+    def __delitem__(self, pack_uri):
+        super(_BoundedPartDict, self).__delitem__(pack_uri)
+        self._forget(pack_uri)
+        self._pinned.discard(pack_uri)
+
+    def __getitem__(self, pack_uri):
+        if pack_uri in self._resident:
+            self._resident.move_to_end(pack_uri)
+            return self._items[pack_uri]
+        part = self._inflated(pack_uri)
+        if not (isinstance(part, bytes) and _is_xml_part(pack_uri)):
+            return part
+        elm = self._items[pack_uri] = self._parse(pack_uri, part)
+        self._admit(pack_uri, part, len(part) * self._TREE_FACTOR)
+        self._shrink()
+        return elm
+
+    def __setitem__(self, pack_uri, part):
+        self._forget(pack_uri)
+        self._items[pack_uri] = part
+        self._replaced.add(pack_uri)
+        if isinstance(part, etree._Element):
+            self._admit(pack_uri, None, sum(1 for _ in part.iter()) * self._ELEMENT_WEIGHT)
+            self._dirty.add(pack_uri)
+            self._shrink()
+
+    @property
+    def resident_size(self):
+        """Estimated bytes of memory taken by the parsed trees currently held."""
+        return self._size
+
+    def copy(self):
+        """Return a |_BoundedPartDict| like :meth:`_PartDict.copy`, with the same limit."""
+        clone = _BoundedPartDict(
+            super(_BoundedPartDict, self).copy()._items, self._limit, self._instrumentation
+        )
+        clone._resident = OrderedDict(self._resident)
+        clone._size = self._size
+        clone._dirty = set(self._dirty)
+        clone._pinned = set(self._pinned)
+        clone._replaced = set(self._replaced)
+        return clone
+
+    @contextlib.contextmanager
+    def hold(self):
+        """Context manager suspending eviction within it; calls nest.
+
+        Edits recorded in an open |Journal| refer to the trees themselves, so these
+        must not be swapped for bytes until the transaction is over.
+        """
+        self._holds += 1
+        try:
+            yield
+        finally:
+            self._holds -= 1
+            self._shrink()
+
+    def mark_dirty(self, pack_uri):
+        if pack_uri in self._resident:
+            self._dirty.add(pack_uri)
+
+    def mark_saved(self, pack_uri, blob):
+        self._replaced.discard(pack_uri)
+        if pack_uri not in self._resident:
+            return
+        self._size -= self._resident.pop(pack_uri)[1]
+        self._admit(pack_uri, blob, len(blob) * self._TREE_FACTOR)
+        self._dirty.discard(pack_uri)
+        self._shrink()
+
+    def pin(self, pack_uri):
+        self._pinned.add(pack_uri)
+
+    def record(self, pack_uri):
+        record = super(_BoundedPartDict, self).record(pack_uri)
+        if record is None:
+            return None
+        return record + (self._resident.get(pack_uri), pack_uri in self._dirty)
+
+    def restore(self, pack_uri, record):
+        self._forget(pack_uri)
+        super(_BoundedPartDict, self).restore(pack_uri, record)
+        if record is None or record[2] is None:
+            return
+        self._admit(pack_uri, *record[2])
+        if record[3]:
+            self._dirty.add(pack_uri)
+
+    def _admit(self, pack_uri, blob, weight):
+        """Start accounting for the tree of `pack_uri`, taking about `weight` bytes.
+
+        `blob` is the bytes the tree was parsed from or last saved as, or |None|.
+        """
+        self._resident[pack_uri] = (blob, weight)
+        self._size += weight
+
+    def _forget(self, pack_uri):
+        """Stop accounting for the tree of `pack_uri`, if resident."""
+        entry = self._resident.pop(pack_uri, None)
+        if entry is not None:
+            self._size -= entry[1]
+        self._dirty.discard(pack_uri)
+
+    def _shrink(self):
+        """Evict trees, least recently used first, until within the limit.
+
+        The most recently used tree is never evicted, so the one just asked for
+        survives even when it alone exceeds the limit.
+        """
+        if self._holds:
+            return
+        for pack_uri in list(self._resident)[:-1]:
+            if self._size <= self._limit:
+                break
+            if pack_uri in self._dirty or pack_uri in self._pinned:
+                continue
+            tree = self._items[pack_uri]
+            if sys.getrefcount(tree) > self._OWN_REFS:
+                continue
+            blob = self._resident[pack_uri][0]
+            serialized = serialize_part(tree)
+            if serialized != blob:
+                self._replaced.add(pack_uri)
+            self._items[pack_uri] = serialized
+            self._forget(pack_uri)
+
+
+class _FrozenPartDict(_PartDict):
+    """|_PartDict| that cannot be changed and parses each part once across threads.
+
+    The bytes read from the package stay in place and parsed trees are kept
+    alongside them, so :meth:`copy` can hand out the original bytes without copying
+    any tree.
+    """
+
+    def __init__(self, items, instrumentation=None):
+        super(_FrozenPartDict, self).__init__(items, instrumentation)
+        self._trees = {}
+        self._locks = {pack_uri: threading.Lock() for pack_uri in items}
+
+    def __delitem__(self, pack_uri):
+        raise ReadOnlyPackageError("package is read-only, clone() it to make changes")
+
+    def __getitem__(self, pack_uri):
+        tree = self._trees.get(pack_uri)
+        if tree is not None:
+            return tree
+        part = self._inflated(pack_uri)
+        if not _is_xml_part(pack_uri):
+            return part
+        with self._locks[pack_uri]:
+            tree = self._trees.get(pack_uri)
+            if tree is None:
+                tree = self._trees[pack_uri] = self._parse(pack_uri, part)
+        return tree
+
+    def __setitem__(self, pack_uri, part):
+        raise ReadOnlyPackageError("package is read-only, clone() it to make changes")
+
+    def blob(self, pack_uri, minify=False, sort_attributes=False):
+        """Return bytes of `pack_uri` as read, or normalized from a private tree."""
+        part = self._inflated(pack_uri)
+        if (minify or sort_attributes) and _is_xml_part(pack_uri):
+            elm = parse_part(part)
+            normalize_part(elm, minify, sort_attributes)
+            return serialize_part(elm)
+        return part
+
+    def copy(self):
+        """Return a mutable |_PartDict| over the bytes read from the package."""
+        return _PartDict(dict(self._items), self._instrumentation)
+
+    def is_dirty(self, pack_uri):
+        return False
+
+    def is_parsed(self, pack_uri):
+        return pack_uri in self._trees
+
+    def view(self, pack_uri):
+        tree = self._trees.get(pack_uri)
+        return tree if tree is not None else self._inflated(pack_uri)
+
+    def _inflated(self, pack_uri):
+        """Return bytes of `pack_uri`, inflating them once if held compressed."""
+        if not isinstance(self._items[pack_uri], (_ZipMember, _MappedMember)):
+            return self._items[pack_uri]
+        with self._locks[pack_uri]:
+            return super(_FrozenPartDict, self)._inflated(pack_uri)
+
+
+_TEXT_TAGS = frozenset(("Content", "Contents"))
+
+
+def _is_xml_part(pack_uri):
+    """True when `pack_uri` names a part that is parsed into an element tree."""
+    return pack_uri.endswith(".xml") and "metadata" not in pack_uri
+
+
+def parse_part(blob):
+    """Return root element parsed from part `blob`, keeping the `<?aid ...?>` PI.
+
+    The processing instruction preceding the root element is stashed in the root's
+    tail so :func:`serialize_part` can write it back out.
+    """
+    elm = parse_xml(blob)
+    pis = elm.getroottree().xpath('/processing-instruction()')
+    if pis:
+        elm.tail = etree.tostring(pis[0])
+    return elm
+
+
+def normalize_part(elm, minify=True, sort_attributes=False):
+    """Strip insignificant whitespace from, and/or sort attributes of, tree `elm`.
+
+    With `minify`, whitespace-only text is removed where it only separates elements:
+    the text of an element having children and the tail of each element, except
+    inside `<Content>` and `<Contents>` where all text is content. A leaf element's
+    text is kept even when blank. With `sort_attributes`, the attributes of each
+    element are reordered by name.
+    """
+    for child in elm.iter():
+        preserve = child.tag in _TEXT_TAGS
+        if minify:
+            if not preserve and len(child) and child.text and not child.text.strip():
+                child.text = None
+            parent = child.getparent()
+            if (
+                parent is not None
+                and parent.tag not in _TEXT_TAGS
+                and child.tail
+                and not child.tail.strip()
+            ):
+                child.tail = None
+        if sort_attributes and len(child.attrib) > 1:
+            attrs = sorted(child.attrib.items())
+            child.attrib.clear()
+            child.attrib.update(attrs)
+
+
+def serialize_part(elm):
+    """Return serialized bytes of part root `elm` as written to the package."""
+    return etree.tostring(elm, standalone=True, encoding='UTF-8', doctype=elm.tail, with_tail=False)
 
 
 class _graphic_item(object):
@@ -71,6 +815,7 @@ class _graphic_item(object):
         self.parts = parts
         root: etree._Element = self.parts['/designmap.xml']
         _src = list(root.xpath('//idPkg:Graphic', namespaces=ns['idPkg']))[0].attrib['src']
+        self.parts.pin(PackURI('/' + _src))
         self._graphic: etree._Element  = self.parts['/' + _src]
         self.colors = {x.attrib['Name']: x for x in self._graphic.iter('Color') if not x.attrib['Name']=='$ID'}
 
@@ -139,10 +884,11 @@ class _designmap_item(object):
     """
     Read '/designmap.xml'
     """
-    def __init__(self, designmap, parts):
+    def __init__(self, parts):
         self.parts = parts
+        self.parts.pin(PackURI('/designmap.xml'))
         self.root: etree._Element = self.parts['/designmap.xml']
-        self.stories_id = root.attrib['StoryList'].split(' ')
+        self.stories_id = self.root.attrib['StoryList'].split(' ')
         # self.stories = self.get_stories
 
     @property
@@ -293,21 +1039,106 @@ class _ZipPkgReader(_PhysPkgReader):
             raise KeyError("no member '%s' in package" % pack_uri)
         return self._blobs[pack_uri]
 
-    def _blobs(self):
-        """dict mapping partname to package part binaries."""
+    def _blobs(self, instrumentation=None, include=None, exclude=None):
+        """dict mapping partname to package part binaries.
+
+        Members filtered out by the `include` and `exclude` glob patterns map to a
+        |_ZipMember| holding their compressed bytes instead. With `instrumentation`,
+        the time to read and inflate each member is recorded as its decompress time.
+        """
         files = {}
         with zipfile.ZipFile(self._pkg_file, "r") as z:
-            for name in z.namelist():
-                if name.endswith(".xml") and 'metadata' not in name:
-                    tmp_path = PackURI('/%s'% name)
-                    files[tmp_path] =  parse_xml(z.read(name))
-                    if files[tmp_path].getroottree().xpath('/processing-instruction()'):
-                        files[tmp_path].tail = etree.tostring(files[tmp_path].getroottree().xpath('/processing-instruction()')[0])
+            for info in z.infolist():
+                partname = PackURI('/%s'% info.filename)
+                start = clock() if instrumentation is not None else None
+                if _ZipMember.can_copy(info) and not _matches(info.filename, include, exclude):
+                    files[partname] = _ZipMember.read(z, info)
                 else:
-                    files[PackURI('/%s'% name)] = z.read(name)
+                    files[partname] = z.read(info)
+                if start is not None:
+                    instrumentation.record(
+                        "decompress",
+                        partname,
+                        clock() - start,
+                        bytes_read=info.compress_size,
+                        size=info.file_size,
+                    )
         return files
 
 
+class _ZipMember(object):
+    """Member of a zip package held as its compressed bytes, not yet inflated."""
+
+    __slots__ = ("info", "data")
+
+    # ---zip local file header; the last two fields are the name and extra lengths---
+    _LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
+    def __init__(self, info, data):
+        self.info = info
+        self.data = data
+
+    @staticmethod
+    def can_copy(info):
+        """True when member `info` can be held compressed and inflated on demand."""
+        return info.compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED) and not (
+            info.flag_bits & 0x1
+        )
+
+    @classmethod
+    def read(cls, zipf, info):
+        """Return |_ZipMember| for `info` read from open `zipf` without inflating it."""
+        fp = zipf.fp
+        fp.seek(info.header_offset)
+        header = cls._LOCAL_HEADER.unpack(fp.read(cls._LOCAL_HEADER.size))
+        fp.seek(info.header_offset + cls._LOCAL_HEADER.size + header[-2] + header[-1])
+        return cls(info, fp.read(info.compress_size))
+
+    @classmethod
+    def pack(cls, membername, blob, compress_type=zipfile.ZIP_DEFLATED):
+        """Return |_ZipMember| holding `blob` compressed, for writing many times."""
+        info = zipfile.ZipInfo(membername, date_time=time.localtime()[:6])
+        info.compress_type = compress_type
+        info.external_attr = 0o600 << 16
+        if compress_type == zipfile.ZIP_DEFLATED:
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+            data = compressor.compress(blob) + compressor.flush()
+        else:
+            data = blob
+        info.file_size = len(blob)
+        info.compress_size = len(data)
+        info.CRC = zlib.crc32(blob)
+        return cls(info, data)
+
+    def inflate(self):
+        """Return the uncompressed bytes of this member."""
+        if self.info.compress_type == zipfile.ZIP_STORED:
+            return self.data
+        return zlib.decompress(self.data, -15)
+
+
+class _MappedMember(object):
+    """Part held as a range of a memory-mapped snapshot file, copied out on access."""
+
+    __slots__ = ("buf", "start", "end")
+
+    def __init__(self, buf, start, end):
+        self.buf = buf
+        self.start = start
+        self.end = end
+
+    def inflate(self):
+        """Return the bytes of this part."""
+        return self.buf[self.start:self.end]
+
+
+def _matches(membername, include, exclude):
+    """True when `membername` is selected by the `include` and `exclude` globs."""
+    if include is not None and not any(fnmatch.fnmatchcase(membername, p) for p in include):
+        return False
+    return not (exclude and any(fnmatch.fnmatchcase(membername, p) for p in exclude))
+
+
 class _PhysPkgWriter(object):
     """Base class for physical package writer objects."""
 
@@ -324,8 +1155,9 @@ class _PhysPkgWriter(object):
 class _ZipPkgWriter(_PhysPkgWriter):
     """Implements |PhysPkgWriter| interface for a zip-file (.pptx file) OPC package."""
 
-    def __init__(self, pkg_file):
+    def __init__(self, pkg_file, instrumentation=None):
         self._pkg_file = pkg_file
+        self._instrumentation = instrumentation
 
     def __enter__(self):
         """Enable use as a context-manager. Opening zip for writing happens here."""
@@ -341,7 +1173,42 @@ class _ZipPkgWriter(_PhysPkgWriter):
 
     def write(self, pack_uri, blob):
         """Write `blob` to zip package with membername corresponding to `pack_uri`."""
+        if self._instrumentation is None:
+            self._zipf.writestr(pack_uri.membername, blob)
+            return
+        start = clock()
         self._zipf.writestr(pack_uri.membername, blob)
+        self._instrumentation.record(
+                "compress",
+                pack_uri,
+                clock() - start,
+                bytes_written=self._zipf.getinfo(pack_uri.membername).compress_size,
+            )
+
+    def write_member(self, pack_uri, member):
+        """Copy |_ZipMember| `member` into the package as `pack_uri`, still compressed.
+
+        `zipfile` has no public API for this, so the local header is written from
+        a copy of the member's `ZipInfo` and the entry registered by hand.
+        """
+        zipf = self._zipf
+        zinfo = copy.copy(member.info)
+        zinfo.filename = pack_uri.membername
+        # ---sizes and CRC are known up front, so no data descriptor follows---
+        zinfo.flag_bits &= ~0x08
+        zinfo.extra = b""
+        zipf.fp.seek(zipf.start_dir)
+        zinfo.header_offset = zipf.fp.tell()
+        zipf.fp.write(zinfo.FileHeader(zinfo.file_size > zipfile.ZIP64_LIMIT))
+        zipf.fp.write(member.data)
+        zipf.filelist.append(zinfo)
+        zipf.NameToInfo[zinfo.filename] = zinfo
+        zipf.start_dir = zipf.fp.tell()
+        zipf._didModify = True
+        if self._instrumentation is not None:
+            self._instrumentation.record(
+                "compress", pack_uri, 0.0, bytes_written=len(member.data)
+            )
 
     @lazyproperty
     def _zipf(self):
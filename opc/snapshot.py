@@ -0,0 +1,91 @@
+# encoding: utf-8
+
+"""Binary snapshots of a |PackageReader| and derived indexes, for fast reloading.
+
+A snapshot holds the current bytes of every part uncompressed, with parsed trees
+serialized as they stand, followed by a pickled table of contents and any
+picklable indexes the caller computed from the package, e.g. style or id
+tables. The file layout is::
+
+    header   magic, format version, offset and length of the table
+    parts    the bytes of each part, back to back
+    table    pickled dict of part offsets, source path and indexes
+
+Reading maps the file into memory and unpickles only the table. The reader gets
+each part as a range of the mapping, copied out the first time it is accessed
+and parsed lazily as usual. Reloading thus costs neither zip decompression nor
+recomputing the indexes, and parts a stage never touches are never read from
+disk. Call :meth:`PackageReader.close` on the reader to release the mapping.
+
+The table is unpickled, and unpickling can run arbitrary code, so only read
+snapshots this process or another trusted one wrote; never one received from
+elsewhere.
+"""
+
+import mmap
+import pickle
+import struct
+
+from pyidml.compat import is_string
+from pyidml.opc.packuri import PackURI
+from pyidml.opc.serialized import PackageReader, _MappedMember, _PartDict
+
+MAGIC = b"IDMLSNAP"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sIQQ")
+
+
+def write_snapshot(reader, path, indexes=None):
+    """Write a snapshot of `reader` to `path`, with the dict `indexes` if given.
+
+    `indexes` must be picklable, so it should hold ids, names and offsets rather
+    than elements. Parts the reader holds compressed are inflated for the snapshot
+    but left compressed in the reader.
+    """
+    pkg_file = reader._pkg_file if is_string(reader._pkg_file) else None
+    table = {"pkg_file": pkg_file, "parts": [], "indexes": indexes or {}}
+    with open(path, "wb") as f:
+        f.write(b"\0" * _HEADER.size)
+        offset = _HEADER.size
+        for partname in reader.parts:
+            member = reader.parts.zip_member(partname)
+            blob = member.inflate() if member is not None else reader.parts.blob(partname)
+            f.write(blob)
+            table["parts"].append((str(partname), offset, offset + len(blob)))
+            offset += len(blob)
+        data = pickle.dumps(table, pickle.HIGHEST_PROTOCOL)
+        f.write(data)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, offset, len(data)))
+
+
+def read_snapshot(path):
+    """Return `(reader, indexes)` loaded from the snapshot file at `path`.
+
+    The reader saves by default to the package file the snapshot's reader was
+    opened from, or needs an explicit path when that reader was opened from a stream.
+    It reads its parts from a memory map of `path`, released by its
+    :meth:`~PackageReader.close`. `path` must be trusted, since the snapshot's
+    table is unpickled.
+    """
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic, version, offset, length = _HEADER.unpack_from(buf)
+        if magic != MAGIC:
+            raise ValueError("'%s' is not a package snapshot" % path)
+        if version != VERSION:
+            raise ValueError("unsupported snapshot format version %d" % version)
+        table = pickle.loads(buf[offset:offset + length])
+    except BaseException:
+        buf.close()
+        raise
+
+    parts = _PartDict(
+        {
+            PackURI(partname): _MappedMember(buf, start, end)
+            for partname, start, end in table["parts"]
+        }
+    )
+    return PackageReader.from_parts(table["pkg_file"], parts, mapping=buf), table["indexes"]
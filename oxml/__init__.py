@@ -490,3 +490,27 @@ register_element_cls("p:txBody", CT_TextBody)
 from .theme import CT_OfficeStyleSheet  # noqa: E402
 
 register_element_cls("a:theme", CT_OfficeStyleSheet)
+
+
+from .spread import (  # noqa: E402
+    CT_Button,
+    CT_GraphicLine,
+    CT_Group,
+    CT_Oval,
+    CT_Page,
+    CT_Polygon,
+    CT_Rectangle,
+    CT_Spread,
+    CT_TextFrame,
+)
+
+register_element_cls("Button", CT_Button)
+register_element_cls("GraphicLine", CT_GraphicLine)
+register_element_cls("Group", CT_Group)
+register_element_cls("MasterSpread", CT_Spread)
+register_element_cls("Oval", CT_Oval)
+register_element_cls("Page", CT_Page)
+register_element_cls("Polygon", CT_Polygon)
+register_element_cls("Rectangle", CT_Rectangle)
+register_element_cls("Spread", CT_Spread)
+register_element_cls("TextFrame", CT_TextFrame)
@@ -58,11 +58,17 @@ class NamespacePrefixedTag(str):
         return super(NamespacePrefixedTag, cls).__new__(cls, nstag)
 
     def __init__(self, nstag):
+        # ---IDML content elements are in no namespace and have no prefix---
+        if ":" not in nstag:
+            self._pfx, self._local_part, self._ns_uri = None, nstag, None
+            return
         self._pfx, self._local_part = nstag.split(":")
         self._ns_uri = _nsmap[self._pfx]
 
     @property
     def clark_name(self):
+        if self._ns_uri is None:
+            return self._local_part
         return "{%s}%s" % (self._ns_uri, self._local_part)
 
     @property
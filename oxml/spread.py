@@ -0,0 +1,204 @@
+# encoding: utf-8
+
+"""Custom element classes for the page items of IDML spreads and master spreads.
+
+IDML stores geometry as strings of space-separated numbers. The classes here parse
+such an attribute through a module-wide cache keyed on the raw string, so reading
+it again, through whichever proxy lxml hands out, costs one attribute lookup and a
+dict lookup. The parsed value depends only on the string, so a changed attribute
+simply misses the cache and nothing needs invalidating. Transforms in particular
+repeat heavily within a document.
+"""
+
+import functools
+
+from lxml import etree
+
+from pyidml.oxml.xmlchemy import BaseOxmlElement
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+_PAGE_ITEM_TAGS = frozenset(
+    (
+        "TextFrame",
+        "Rectangle",
+        "Oval",
+        "Polygon",
+        "GraphicLine",
+        "Group",
+        "Button",
+    )
+)
+
+
+class _CachedNumbers(object):
+    """Descriptor reading attribute `attr_name` as a tuple of floats.
+
+    Evaluates to `default` when the attribute is absent. Assigning a sequence of
+    numbers writes the attribute back in IDML form.
+    """
+
+    def __init__(self, attr_name, default=None):
+        self._attr_name = attr_name
+        self._default = default
+
+    def __get__(self, obj, type=None):
+        if obj is None:
+            return self
+        raw = obj.get(self._attr_name)
+        if raw is None:
+            return self._default
+        return _parse_numbers(raw)
+
+    def __set__(self, obj, value):
+        obj.set(self._attr_name, " ".join("%.15g" % v for v in value))
+
+
+class BaseIdmlElement(BaseOxmlElement):
+    """Base class for IDML elements carrying a `Self` id and numeric attributes."""
+
+    @property
+    def self_id(self):
+        """Value of `Self`, the id of this element within the document."""
+        return self.get("Self")
+
+    def xpath(self, path, **kwargs):
+        """Plain lxml `xpath()`, taking `namespaces` and variables like any element.
+
+        Overrides the Open XML namespace mapping |BaseOxmlElement| imposes, which
+        has no use for IDML and rejects keyword arguments.
+        """
+        return etree.ElementBase.xpath(self, path, **kwargs)
+
+
+class CT_PageItem(BaseIdmlElement):
+    """Base class for the page items placed on a spread: frames, shapes, groups."""
+
+    item_transform = _CachedNumbers("ItemTransform", IDENTITY)
+
+    @property
+    def item_layer(self):
+        """`Self` id of the layer this item is on."""
+        return self.get("ItemLayer")
+
+    @property
+    def name(self):
+        """Value of `Name`, |None| when not set."""
+        return self.get("Name")
+
+    @property
+    def path_points(self):
+        """List of `(x, y)` anchors of this item's path, in its own coordinates.
+
+        Empty for a group, whose extent is that of its members.
+        """
+        return [
+            _parse_numbers(point.get("Anchor"))
+            for point in self.findall(
+                "Properties/PathGeometry/GeometryPathType/PathPointArray/PathPointType"
+            )
+        ]
+
+
+class CT_Button(CT_PageItem):
+    """`Button` element, an interactive page item."""
+
+
+class CT_GraphicLine(CT_PageItem):
+    """`GraphicLine` element, a straight line."""
+
+
+class CT_Group(CT_PageItem):
+    """`Group` element, page items grouped together."""
+
+    @property
+    def page_items(self):
+        """List of the page items directly in this group."""
+        return [child for child in self if child.tag in _PAGE_ITEM_TAGS]
+
+
+class CT_Oval(CT_PageItem):
+    """`Oval` element."""
+
+
+class CT_Page(BaseIdmlElement):
+    """`Page` element of a spread or master spread."""
+
+    geometric_bounds = _CachedNumbers("GeometricBounds")
+    item_transform = _CachedNumbers("ItemTransform", IDENTITY)
+    master_page_transform = _CachedNumbers("MasterPageTransform", IDENTITY)
+
+    @property
+    def applied_master(self):
+        """`Self` id of the master spread applied to this page, |None| for none."""
+        master = self.get("AppliedMaster")
+        return None if master in (None, "n") else master
+
+    @property
+    def name(self):
+        """Value of `Name`, the page number as displayed."""
+        return self.get("Name")
+
+    @property
+    def override_list(self):
+        """List of `Self` ids of master items overridden on this page."""
+        return self.get("OverrideList", "").split()
+
+
+class CT_Polygon(CT_PageItem):
+    """`Polygon` element."""
+
+
+class CT_Rectangle(CT_PageItem):
+    """`Rectangle` element, a shape that may hold a placed graphic."""
+
+    @property
+    def graphic(self):
+        """The `Image`, `PDF`, `EPS` or other placed graphic child, |None| if empty."""
+        for child in self:
+            if child.tag in ("Image", "PDF", "EPS", "ImportedPage", "WMF", "PICT"):
+                return child
+        return None
+
+
+class CT_Spread(BaseIdmlElement):
+    """`Spread` or `MasterSpread` element."""
+
+    item_transform = _CachedNumbers("ItemTransform", IDENTITY)
+
+    @property
+    def pages(self):
+        """List of the |CT_Page| children of this spread."""
+        return self.findall("Page")
+
+    @property
+    def page_items(self):
+        """List of the page items directly on this spread, groups not flattened."""
+        return [child for child in self if child.tag in _PAGE_ITEM_TAGS]
+
+
+class CT_TextFrame(CT_PageItem):
+    """`TextFrame` element, a frame showing part of a story."""
+
+    @property
+    def next_frame(self):
+        """`Self` id of the next frame in the story's thread, |None| if last."""
+        frame = self.get("NextTextFrame")
+        return None if frame in (None, "n") else frame
+
+    @property
+    def parent_story(self):
+        """`Self` id of the story whose text flows through this frame."""
+        return self.get("ParentStory")
+
+    @property
+    def previous_frame(self):
+        """`Self` id of the previous frame in the story's thread, |None| if first."""
+        frame = self.get("PreviousTextFrame")
+        return None if frame in (None, "n") else frame
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_numbers(raw):
+    """Return tuple of the floats in space-separated string `raw`."""
+    return tuple(map(float, raw.split()))
@@ -0,0 +1,532 @@
+# encoding: utf-8
+
+"""Preflight engine checking an IDML package for common production problems.
+
+A check is a |Check| subclass declaring the kinds of part it reads, e.g. "Story" or
+"Spread" as named by the designmap, or "designmap" for designmap.xml itself. The
+engine parses each part once, hands the tree to every check interested in its kind
+and collects what each returns; a check then turns the results gathered over all its
+parts into |Issue| objects. Inspecting parts is independent from part to part, so
+the engine can fan it out over a process pool.
+"""
+
+import math
+
+from concurrent.futures import ProcessPoolExecutor
+
+from pyidml.links import LINK_KINDS, LinkIndex, iter_links
+from pyidml.opc.packuri import PackURI
+from pyidml.opc.serialized import PackageReader, PartSource
+from pyidml.oxml import parse_xml
+from pyidml.text.fontusage import (
+    iter_run_fonts,
+    read_declared_fonts,
+    read_style_fonts,
+    resolve_run_font,
+)
+
+DESIGNMAP_URI = PackURI("/designmap.xml")
+
+# ---advance of a character as a fraction of the em, by rough glyph class---
+_NARROW_WIDTH = 0.24
+_LOWER_WIDTH = 0.44
+_DIGIT_WIDTH = 0.47
+_UPPER_WIDTH = 0.57
+_WIDE_WIDTH = 0.72
+
+_NARROW_CHARS = frozenset(" fijlrtI.,;:!|'\"()[]-/`")
+_WIDE_CHARS = frozenset("mwMW@%")
+
+# ---height of a frame's first line, from the top of the frame to its baseline---
+_ASCENT = 0.7
+
+_SWATCH_PREFIXES = ("Color/", "Swatch/", "Gradient/", "Tint/", "MixedInk/", "MixedInkGroup/")
+
+
+class Issue(object):
+    """One problem found by a preflight check."""
+
+    def __init__(self, check, message, partname=None, self_id=None):
+        self.check = check
+        self.message = message
+        self.partname = partname
+        self.self_id = self_id
+
+    def __repr__(self):
+        return "<Issue %s: %s>" % (self.check, self.message)
+
+
+class Check(object):
+    """Base class for preflight checks.
+
+    Subclasses set `kinds` to the part kinds they need and implement
+    :meth:`inspect`, which runs once per such part, possibly in another process,
+    and :meth:`report`, which runs once in the calling process. Instances must be
+    picklable.
+    """
+
+    name = None
+    kinds = ()
+
+    def inspect(self, kind, partname, root):
+        """Return picklable findings for the part `partname` of `kind`, at `root`."""
+        raise NotImplementedError(  # pragma: no cover
+            "`%s` must implement `.inspect()`" % type(self).__name__
+        )
+
+    def report(self, findings):
+        """Return list of |Issue| from `findings`, a list of `(kind, partname, result)`."""
+        raise NotImplementedError(  # pragma: no cover
+            "`%s` must implement `.report()`" % type(self).__name__
+        )
+
+
+class MissingFonts(Check):
+    """Fonts used by runs or styles but not declared installed in Fonts.xml."""
+
+    name = "missing-fonts"
+    kinds = ("Fonts", "Styles", "Story")
+
+    def inspect(self, kind, partname, root):
+        if kind == "Fonts":
+            return read_declared_fonts(root)
+        if kind == "Styles":
+            return read_style_fonts(root)
+        specs = {}
+        for _, _, spec in iter_run_fonts(root):
+            specs[spec] = specs.get(spec, 0) + 1
+        return specs
+
+    def report(self, findings):
+        declared, style_fonts, runs = {}, {}, {}
+        for kind, partname, result in findings:
+            if kind == "Fonts":
+                declared.update(result)
+            elif kind == "Styles":
+                style_fonts.update(result)
+        for kind, partname, result in findings:
+            if kind == "Story":
+                for spec in result:
+                    key = resolve_run_font(spec, style_fonts)
+                    runs.setdefault(key, []).append(partname)
+        issues = []
+        for key, partnames in runs.items():
+            if key[0] is not None and declared.get(key) != "Installed":
+                issues.append(
+                    Issue(
+                        self.name,
+                        "font %s %s is %s, used in %d stories"
+                        % (key[0], key[1] or "", declared.get(key, "undeclared"), len(set(partnames))),
+                        partnames[0],
+                    )
+                )
+        return issues
+
+
+class UnresolvedSwatches(Check):
+    """References to colors, tints, gradients or swatches Graphic.xml does not define."""
+
+    name = "unresolved-swatches"
+    kinds = ("Graphic", "Styles", "MasterSpread", "Spread", "Story")
+
+    def inspect(self, kind, partname, root):
+        if kind == "Graphic":
+            return {elm.get("Self") for elm in root if elm.get("Self") is not None}
+        refs = {}
+        for elm in root.iter():
+            for value in elm.attrib.values():
+                if value.startswith(_SWATCH_PREFIXES):
+                    refs.setdefault(value, elm.get("Self"))
+            # ---properties like <FillColor type="object">Color/x</FillColor>---
+            text = elm.text
+            if text and elm.get("type") == "object" and text.startswith(_SWATCH_PREFIXES):
+                refs.setdefault(text, _owner_id(elm))
+        return refs
+
+    def report(self, findings):
+        defined = set()
+        for kind, partname, result in findings:
+            if kind == "Graphic":
+                defined |= result
+        issues = []
+        for kind, partname, result in findings:
+            if kind == "Graphic":
+                continue
+            for ref, self_id in result.items():
+                if ref not in defined:
+                    issues.append(
+                        Issue(self.name, "unresolved reference to %s" % ref, partname, self_id)
+                    )
+        return issues
+
+
+class OversetRisk(Check):
+    """Stories threaded to frames whose estimated set text exceeds the frames' capacity.
+
+    Each paragraph is estimated to take as many lines as its characters need in
+    the widest column of the story's frames. A character's advance is estimated
+    from a rough glyph class: about a quarter em for spaces, punctuation and
+    narrow letters, 0.44 em for other lowercase letters, and up to 0.72 em for
+    wide ones. These widths were calibrated so that every story of a clean sample
+    document fits its frames. Tracking and horizontal scale adjust the advance.
+    The lines are set at the paragraph's largest leading. Point size and leading
+    are taken from the run, then its character style, its paragraph range and
+    its paragraph style, as InDesign resolves them. "Auto" leading is 120% of the
+    point size. The result is compared with the total column height of the
+    frames, after insets. Stories not placed in any frame, or placed in one that
+    auto-sizes its height, are not checked.
+
+    A story is flagged when it needs more than `ratio` times that height. The
+    default of 1.1 is a 10% margin for the estimate's error.
+    """
+
+    name = "overset-risk"
+    kinds = ("Spread", "Styles", "Story")
+
+    def __init__(self, ratio=1.1):
+        self.ratio = ratio
+
+    def inspect(self, kind, partname, root):
+        if kind == "Spread":
+            frames = {}
+            for frame in root.iter("TextFrame"):
+                frames.setdefault(frame.get("ParentStory"), []).append(_frame_columns(frame))
+            return frames
+        if kind == "Styles":
+            return _style_metrics(root)
+        story = root.find("Story")
+        paragraphs = [[]]
+        for elm in root.iter("Content", "Br"):
+            if elm.tag == "Br":
+                paragraphs.append([])
+                continue
+            run = elm.getparent()
+            para = run.getparent() if run.tag == "CharacterStyleRange" else run
+            text = elm.text or ""
+            paragraphs[-1].append(
+                (
+                    len(text),
+                    _text_width(text),
+                    _run_metrics(run),
+                    _run_metrics(para),
+                    run.get("AppliedCharacterStyle"),
+                    para.get("AppliedParagraphStyle"),
+                )
+            )
+        return (story.get("Self") if story is not None else None), paragraphs
+
+    def report(self, findings):
+        frames, styles = {}, {}
+        for kind, partname, result in findings:
+            if kind == "Spread":
+                for story_id, columns in result.items():
+                    frames.setdefault(story_id, []).extend(columns)
+            elif kind == "Styles":
+                styles.update(result)
+        issues = []
+        for kind, partname, result in findings:
+            if kind != "Story":
+                continue
+            story_id, paragraphs = result
+            columns = frames.get(story_id)
+            if not columns:
+                continue
+            width = max(w for w, _, _ in columns)
+            capacity = sum(h * n for _, h, n in columns)
+            if width <= 0 or capacity <= 0:
+                continue
+            heights = [_paragraph_height(p, styles, width) for p in paragraphs if p]
+            if not heights:
+                continue
+            # ---a story's first line only needs its ascent, not its full leading---
+            needed = sum(h for h, _ in heights) - max(0.0, heights[0][1])
+            if needed > capacity * self.ratio:
+                issues.append(
+                    Issue(
+                        self.name,
+                        "story needs about %d pt of %d pt of column height" % (needed, capacity),
+                        partname,
+                        story_id,
+                    )
+                )
+        return issues
+
+
+class EmptyStories(Check):
+    """Stories with no text at all."""
+
+    name = "empty-stories"
+    kinds = ("Story",)
+
+    def inspect(self, kind, partname, root):
+        story = root.find("Story")
+        text = "".join(c.text or "" for c in root.iter("Content"))
+        return (story.get("Self") if story is not None else None), not text.strip()
+
+    def report(self, findings):
+        return [
+            Issue(self.name, "story is empty", partname, story_id)
+            for kind, partname, (story_id, empty) in findings
+            if empty
+        ]
+
+
+class MissingLinks(Check):
+    """Placed graphics whose linked file cannot be found on this machine."""
+
+    name = "missing-links"
+    kinds = LINK_KINDS
+
+    def inspect(self, kind, partname, root):
+        return list(iter_links(partname, root))
+
+    def report(self, findings):
+        index = LinkIndex()
+        for kind, partname, result in findings:
+            for uri, placement in result:
+                index.links.setdefault(uri, []).append(placement)
+        return [
+            Issue(self.name, "linked file %s is missing" % uri, p.partname, p.link_id)
+            for uri in index.missing()
+            for p in index.links[uri]
+            if not p.embedded
+        ]
+
+
+class MissingStoryParts(Check):
+    """Ids in the designmap's `StoryList` that no story part provides."""
+
+    name = "missing-story-parts"
+    kinds = ("designmap", "Story", "BackingStory")
+
+    def inspect(self, kind, partname, root):
+        if kind == "designmap":
+            return root.get("StoryList", "").split()
+        return [elm.get("Self") for elm in root if elm.get("Self") is not None]
+
+    def report(self, findings):
+        listed, provided = [], set()
+        for kind, partname, result in findings:
+            if kind == "designmap":
+                listed = result
+            else:
+                provided.update(result)
+        return [
+            Issue(self.name, "StoryList id %s has no story part" % story_id, DESIGNMAP_URI, story_id)
+            for story_id in listed
+            if story_id not in provided
+        ]
+
+
+DEFAULT_CHECKS = (
+    MissingFonts,
+    UnresolvedSwatches,
+    OversetRisk,
+    EmptyStories,
+    MissingLinks,
+    MissingStoryParts,
+)
+
+
+class Preflight(object):
+    """Runs `checks` over packages, parsing each part once.
+
+    `checks` is a sequence of |Check| instances and defaults to one of each check
+    in `DEFAULT_CHECKS`. With `workers` greater than 1, parts are parsed and
+    inspected in a pool of that many processes.
+    """
+
+    def __init__(self, checks=None, workers=None):
+        self._checks = list(checks) if checks is not None else [c() for c in DEFAULT_CHECKS]
+        self._workers = workers
+
+    def run(self, pkg):
+        """Return list of |Issue| for `pkg`, a |PackageReader|, path or stream."""
+        jobs = list(self._jobs(pkg))
+        if self._workers and self._workers > 1:
+            with ProcessPoolExecutor(self._workers) as executor:
+                results = list(executor.map(_inspect_part, jobs, chunksize=8))
+        else:
+            results = [_inspect_part(job) for job in jobs]
+
+        findings = [[] for _ in self._checks]
+        for (checks, kind, partname, _), part_results in zip(jobs, results):
+            for (i, _), result in zip(checks, part_results):
+                findings[i].append((kind, partname, result))
+
+        issues = []
+        for check, check_findings in zip(self._checks, findings):
+            issues.extend(check.report(check_findings))
+        return issues
+
+    def _jobs(self, pkg):
+        """Generate `(checks, kind, partname, blob)` for each part some check needs.
+
+        `checks` is a list of `(index, check)` pairs of the checks reading the part.
+        """
+        with PartSource(pkg) as source:
+            parts = [("designmap", DESIGNMAP_URI)] + source.manifest
+            for kind, partname in parts:
+                checks = [(i, c) for i, c in enumerate(self._checks) if kind in c.kinds]
+                if not checks or partname not in source:
+                    continue
+                if isinstance(pkg, PackageReader):
+                    blob = pkg.parts.blob(partname)
+                else:
+                    blob = source[partname]
+                yield checks, kind, partname, blob
+
+
+def _frame_columns(frame):
+    """Return `(column_width, column_height, column_count)` of text `frame`, in points.
+
+    Sizes are those of the bounding box of the frame's path as transformed, less
+    the insets and column gutters of its `TextFramePreference`. A frame that grows
+    to fit its text has infinite height.
+    """
+    xs, ys = [], []
+    for point in frame.iter("PathPointType"):
+        x, y = point.get("Anchor").split()
+        xs.append(float(x))
+        ys.append(float(y))
+    if not xs:
+        return 0.0, 0.0, 1
+    a, b, c, d = (float(v) for v in frame.get("ItemTransform", "1 0 0 1 0 0").split()[:4])
+    width = (max(xs) - min(xs)) * math.hypot(a, b)
+    height = (max(ys) - min(ys)) * math.hypot(c, d)
+    count, gutter = 1, 12.0
+    prefs = frame.find("TextFramePreference")
+    if prefs is not None:
+        count = int(prefs.get("TextColumnCount", 1)) or 1
+        gutter = float(prefs.get("TextColumnGutter", gutter))
+        if prefs.get("AutoSizingType", "Off") not in ("Off", "WidthOnly"):
+            height = float("inf")
+        insets = prefs.get("InsetSpacing")
+        if insets:
+            top, left, bottom, right = (float(v) for v in insets.split())
+            width -= left + right
+            height -= top + bottom
+    return (width - gutter * (count - 1)) / count, height, count
+
+
+def _inspect_part(job):
+    """Parse the part of `job` once and return the findings of each of its checks.
+
+    Module-level so it can be shipped to worker processes.
+    """
+    checks, kind, partname, blob = job
+    root = parse_xml(blob)
+    return [check.inspect(kind, partname, root) for _, check in checks]
+
+
+def _leading(elm):
+    """Return the `Leading` set in `elm`'s properties in points, or |None| if unset."""
+    leading = elm.find("Properties/Leading")
+    if leading is None:
+        return None
+    if leading.get("type") == "unit":
+        return float(leading.text)
+    return "Auto"
+
+
+def _number(elm, name):
+    """Return attribute `name` of `elm` as a float, or |None| when absent."""
+    value = elm.get(name)
+    return float(value) if value else None
+
+
+def _owner_id(elm):
+    """Return `Self` id of the nearest element enclosing property `elm` that has one."""
+    while elm is not None:
+        self_id = elm.get("Self")
+        if self_id is not None:
+            return self_id
+        elm = elm.getparent()
+    return None
+
+
+def _paragraph_height(pieces, styles, width):
+    """Return `(height, slack)` of a paragraph of `pieces` set `width` wide, in points.
+
+    `height` is the estimated height of its lines and `slack` how much its leading
+    exceeds the ascent of its text, which its first line does not need at the top
+    of a frame.
+
+    `pieces` holds a `(chars, ems, run_metrics, para_metrics, char_style, para_style)`
+    tuple for each `<Content>` of the paragraph, `ems` being its width as returned
+    by :func:`_text_width` and the metrics as returned by
+    :func:`_run_metrics` and completed from `styles`, as returned by
+    :func:`_style_metrics`.
+    """
+    length = 0.0
+    leading = largest = 0.0
+    for chars, ems, run, para, char_style, para_style in pieces:
+        candidates = (
+            run, _resolve_metrics(styles, char_style), para, _resolve_metrics(styles, para_style)
+        )
+        size, lead, auto, tracking, scale = (
+            next((m[i] for m in candidates if m[i] is not None), default)
+            for i, default in enumerate((12.0, "Auto", 120.0, 0.0, 100.0))
+        )
+        length += (ems + chars * tracking / 1000.0) * size * scale / 100.0
+        leading = max(leading, size * auto / 100.0 if lead == "Auto" else lead)
+        largest = max(largest, size)
+    return max(1, math.ceil(length / width)) * leading, leading - largest * _ASCENT
+
+
+def _resolve_metrics(styles, style_id):
+    """Return metrics of `style_id` as for :func:`_run_metrics`, following BasedOn."""
+    metrics = [None] * 5
+    seen = set()
+    while style_id in styles and style_id not in seen:
+        seen.add(style_id)
+        style_metrics, based_on = styles[style_id]
+        metrics = [m if m is not None else s for m, s in zip(metrics, style_metrics)]
+        style_id = based_on
+    return metrics
+
+
+def _run_metrics(elm):
+    """Return metrics overrides set on range or style `elm`, |None| where unset.
+
+    The metrics are the tuple `(point_size, leading, auto_leading, tracking,
+    horizontal_scale)`, `leading` being "Auto" or points and `auto_leading` a
+    percentage of the point size.
+    """
+    return (_number(elm, "PointSize"), _leading(elm), _number(elm, "AutoLeading"),
+            _number(elm, "Tracking"), _number(elm, "HorizontalScale"))
+
+
+def _style_metrics(root):
+    """Return dict of style `Self` id to `(metrics, based_on)` in Styles.xml.
+
+    `metrics` is as returned by :func:`_run_metrics`.
+    """
+    styles = {}
+    for elm in root.iter("ParagraphStyle", "CharacterStyle"):
+        based_on = elm.find("Properties/BasedOn")
+        ref = None
+        if based_on is not None and based_on.text:
+            ref = based_on.text
+            # ---a "string" BasedOn names a style of the same kind---
+            if based_on.get("type") == "string":
+                ref = "%s/%s" % (elm.tag, ref)
+        styles[elm.get("Self")] = (_run_metrics(elm), ref)
+    return styles
+
+
+def _text_width(text):
+    """Return estimated width of `text` in ems, by the glyph class of each character."""
+    width = 0.0
+    for ch in text:
+        if ch in _NARROW_CHARS:
+            width += _NARROW_WIDTH
+        elif ch in _WIDE_CHARS:
+            width += _WIDE_WIDTH
+        elif ch.isupper():
+            width += _UPPER_WIDTH
+        elif ch.isdigit():
+            width += _DIGIT_WIDTH
+        else:
+            width += _LOWER_WIDTH
+    return width
@@ -0,0 +1,209 @@
+# encoding: utf-8
+
+"""Splitting of an IDML package into smaller packages, per spread or per story.
+
+Each output carries the selected spreads, the stories placed on them (following
+frames anchored inside those stories) and every shared resource: master spreads,
+Resources, XML and META-INF members. Only designmap.xml is rewritten; all other
+members are streamed to the output zip as the bytes the source holds, so no part is
+parsed or copied for the split beyond a single scan of the spreads and stories.
+"""
+
+import copy
+import posixpath
+
+from pyidml.opc.packuri import PackURI
+from pyidml.opc.serialized import (
+    PartSource,
+    _ZipPkgWriter,
+    iterevents,
+    ns,
+    parse_part,
+    serialize_part,
+)
+
+DESIGNMAP_URI = PackURI("/designmap.xml")
+
+
+def split_package(reader, path_for, by="spread"):
+    """Write one package per spread or per story of `reader` and return their keys.
+
+    `by` is "spread" to write one package per spread, or "story" to write one per
+    story placed on a spread, carrying every spread the story runs through. Each
+    output is written to `path_for(key)`, a path or writable stream, where `key` is
+    the `Self` id of the spread or story. Returns the list of keys written, in
+    document order.
+    """
+    splitter = _PackageSplitter(reader)
+    if by == "spread":
+        selections = splitter.spread_selections()
+    elif by == "story":
+        selections = splitter.story_selections()
+    else:
+        raise ValueError("by must be 'spread' or 'story', got %r" % by)
+
+    keys = []
+    for key, spreads in selections:
+        splitter.write(spreads, path_for(key))
+        keys.append(key)
+    return keys
+
+
+class _PackageSplitter(object):
+    """Writes subsets of the spreads of `reader` as standalone packages."""
+
+    def __init__(self, reader):
+        self._reader = reader
+        self._source = PartSource(reader)
+        self._designmap = self._source[DESIGNMAP_URI]
+        manifest = self._source.manifest
+        self._spreads = [uri for kind, uri in manifest if kind == "Spread"]
+        self._masters = [uri for kind, uri in manifest if kind == "MasterSpread"]
+        self._stories = {
+            _story_id(uri): uri for kind, uri in manifest if kind == "Story"
+        }
+        self._scans = {}
+
+    def spread_selections(self):
+        """Return `(spread_id, [spread_partname])` pairs, one per spread."""
+        return [(self._scan(uri)[0], [uri]) for uri in self._spreads]
+
+    def story_selections(self):
+        """Return `(story_id, [spread_partname, ...])` pairs, one per placed story."""
+        spreads_of = {}
+        for uri in self._spreads:
+            for story_id in self._scan(uri)[2]:
+                spreads_of.setdefault(story_id, []).append(uri)
+        return [
+            (story_id, spreads_of[story_id])
+            for story_id in self._stories
+            if story_id in spreads_of
+        ]
+
+    def write(self, spreads, pkg_file):
+        """Write package containing partnames `spreads` to `pkg_file`.
+
+        Parts still held compressed are copied across as they are, without being
+        inflated and compressed again.
+        """
+        story_ids = self._story_closure(self._masters + list(spreads))
+        keep = set(spreads) | {self._stories[s] for s in story_ids}
+        dropped = (set(self._spreads) | set(self._stories.values())) - keep
+
+        parts = self._reader.parts
+        with _ZipPkgWriter(pkg_file) as writer:
+            for pack_uri in parts:
+                if pack_uri in dropped:
+                    continue
+                if pack_uri == DESIGNMAP_URI:
+                    writer.write(pack_uri, self._designmap_for(spreads, story_ids))
+                    continue
+                member = parts.zip_member(pack_uri)
+                if member is not None:
+                    writer.write_member(pack_uri, member)
+                else:
+                    writer.write(pack_uri, parts.blob(pack_uri))
+
+    def _designmap_for(self, spreads, story_ids):
+        """Return serialized designmap listing only `spreads` and `story_ids`."""
+        designmap = self._designmap
+        if isinstance(designmap, bytes):
+            designmap = parse_part(designmap)
+        else:
+            designmap = copy.deepcopy(designmap)
+
+        spread_srcs = {uri.membername for uri in spreads}
+        story_srcs = {self._stories[s].membername for s in story_ids}
+        idpkg = "{%s}" % ns["idPkg"]["idPkg"]
+        for elm in list(designmap):
+            if elm.tag == idpkg + "Spread" and elm.get("src") not in spread_srcs:
+                designmap.remove(elm)
+            elif elm.tag == idpkg + "Story" and elm.get("src") not in story_srcs:
+                designmap.remove(elm)
+
+        designmap.set(
+            "StoryList",
+            " ".join(
+                s
+                for s in designmap.get("StoryList", "").split()
+                if s in story_ids or s not in self._stories
+            ),
+        )
+        self._rewrite_sections(designmap, spreads)
+        return serialize_part(designmap)
+
+    def _rewrite_sections(self, designmap, spreads):
+        """Drop or shorten `Section` elements to cover only pages of `spreads`."""
+        section_of = {}
+        sections = {s.get("PageStart"): s for s in designmap.iter("Section")}
+        current = None
+        for uri in self._spreads:
+            for page_id in self._scan(uri)[1]:
+                current = sections.get(page_id, current)
+                section_of[page_id] = current
+
+        counts = {}
+        for uri in spreads:
+            for page_id in self._scan(uri)[1]:
+                section = section_of.get(page_id)
+                if section is None:
+                    continue
+                if section not in counts:
+                    counts[section] = 0
+                    section.set("PageStart", page_id)
+                counts[section] += 1
+
+        for section in sections.values():
+            if section not in counts:
+                section.getparent().remove(section)
+                continue
+            section.set("Length", str(counts[section]))
+            if section.get("AlternateLayoutLength") is not None:
+                section.set("AlternateLayoutLength", str(counts[section]))
+
+    def _scan(self, pack_uri):
+        """Return `(self_id, page_ids, story_ids)` found in part `pack_uri`.
+
+        `story_ids` are the `ParentStory` references of the frames and text paths
+        in the part, in document order and without repeats. Each part is scanned
+        once, streaming when it has not been parsed.
+        """
+        scan = self._scans.get(pack_uri)
+        if scan is not None:
+            return scan
+
+        part = self._source[pack_uri]
+        streaming = isinstance(part, bytes)
+        self_id, page_ids, story_ids = None, [], {}
+        for event, elm in iterevents(part, ("start", "end")):
+            if event == "end":
+                if streaming:
+                    elm.clear()
+                continue
+            if self_id is None and elm.get("Self") is not None:
+                self_id = elm.get("Self")
+            if elm.tag == "Page":
+                page_ids.append(elm.get("Self"))
+            story_id = elm.get("ParentStory")
+            if story_id is not None:
+                story_ids[story_id] = None
+        scan = self._scans[pack_uri] = (self_id, page_ids, list(story_ids))
+        return scan
+
+    def _story_closure(self, pack_uris):
+        """Return set of story ids placed in `pack_uris`, directly or anchored."""
+        pending = [s for uri in pack_uris for s in self._scan(uri)[2]]
+        story_ids = set()
+        while pending:
+            story_id = pending.pop()
+            if story_id in story_ids or story_id not in self._stories:
+                continue
+            story_ids.add(story_id)
+            pending.extend(self._scan(self._stories[story_id])[2])
+        return story_ids
+
+
+def _story_id(pack_uri):
+    """Return `Self` id of the story stored at `pack_uri`, e.g. "u1f" for Story_u1f.xml."""
+    filename = posixpath.splitext(pack_uri.filename)[0]
+    return filename[len("Story_"):]
@@ -0,0 +1,150 @@
+# encoding: utf-8
+
+"""Quick summary of an IDML file without loading it.
+
+:func:`peek` reads the zip central directory, the top of designmap.xml and the XMP
+packet in META-INF/metadata.xml. Both XML members are decompressed and parsed
+incrementally, and the designmap stops being read once its sections have been
+seen, well before the story references and the rest of the document settings.
+This makes it cheap enough to run over a whole archive of files.
+"""
+
+import zipfile
+
+from lxml import etree
+
+from pyidml.opc.serialized import ns
+
+_DC = "{%s}" % ns["dc"]["dc"]
+_RDF = "{%s}" % ns["rdf"]["rdf"]
+_XMP = "{%s}" % ns["xmp"]["xmp"]
+
+_CHUNK_SIZE = 16384
+
+
+class PackageInfo(object):
+    """Summary of an IDML file as returned by :func:`peek`.
+
+    Counts of spreads, master spreads and stories are those of the members in the
+    archive. `page_count` is the total length of the document's sections. XMP
+    values are |None| when the file carries no metadata packet or lacks them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.dom_version = None
+        self.product_version = None
+        self.page_count = 0
+        self.spread_count = 0
+        self.master_spread_count = 0
+        self.story_count = 0
+        self.title = None
+        self.creator_tool = None
+        self.create_date = None
+        self.modify_date = None
+        self.metadata_date = None
+
+    def __repr__(self):
+        return "<PackageInfo %s DOM %s, %d pages, %d stories>" % (
+            self.path,
+            self.dom_version,
+            self.page_count,
+            self.story_count,
+        )
+
+
+def peek(pkg_file):
+    """Return |PackageInfo| for the ``.idml`` file at path or stream `pkg_file`."""
+    info = PackageInfo(pkg_file if not hasattr(pkg_file, "read") else None)
+    with zipfile.ZipFile(pkg_file) as zipf:
+        for name in zipf.namelist():
+            if name.startswith("Spreads/"):
+                info.spread_count += 1
+            elif name.startswith("MasterSpreads/"):
+                info.master_spread_count += 1
+            elif name.startswith("Stories/"):
+                info.story_count += 1
+        with zipf.open("designmap.xml") as stream:
+            _peek_designmap(stream, info)
+        if "META-INF/metadata.xml" in zipf.NameToInfo:
+            with zipf.open("META-INF/metadata.xml") as stream:
+                _peek_metadata(stream, info)
+    return info
+
+
+def _peek_designmap(stream, info):
+    """Fill in `info` from the designmap read from `stream`, stopping after sections."""
+    depth = 0
+    in_sections = False
+    for event, elm in _pull(stream, ("start", "end", "pi")):
+        if event == "pi":
+            if depth == 0 and elm.target == "aid":
+                info.product_version = elm.get("product")
+            continue
+        if event == "end":
+            depth -= 1
+            if depth == 1:
+                # ---drop finished top-level elements so memory stays flat---
+                elm.clear()
+                while elm.getprevious() is not None:
+                    del elm.getparent()[0]
+            continue
+        depth += 1
+        if depth == 1:
+            info.dom_version = elm.get("DOMVersion")
+        elif depth == 2:
+            if elm.tag == "Section":
+                info.page_count += int(elm.get("Length", 0))
+                in_sections = True
+            elif in_sections:
+                return
+
+
+def _peek_metadata(stream, info):
+    """Fill in `info` from the `rdf:Description` elements of the XMP packet in `stream`.
+
+    XMP may spread properties over several descriptions, so all of them are read,
+    up to the end of `rdf:RDF`. A property given more than once keeps its first value.
+    """
+    for event, elm in _pull(stream, ("end",)):
+        if elm.tag == _RDF + "RDF":
+            return
+        if elm.tag != _RDF + "Description":
+            continue
+        for name, attr in (
+            ("creator_tool", "CreatorTool"),
+            ("create_date", "CreateDate"),
+            ("modify_date", "ModifyDate"),
+            ("metadata_date", "MetadataDate"),
+        ):
+            value = elm.findtext(_XMP + attr) or elm.get(_XMP + attr)
+            if value is not None and getattr(info, name) is None:
+                setattr(info, name, value)
+        title = elm.find(_DC + "title")
+        if title is not None and info.title is None:
+            items = title.findall(".//" + _RDF + "li")
+            for item in items:
+                if item.get("{http://www.w3.org/XML/1998/namespace}lang") == "x-default":
+                    info.title = item.text
+                    break
+            else:
+                info.title = items[0].text if items else None
+
+
+def _pull(stream, events):
+    """Generate `(event, element)` pairs parsed from `stream` as it is read.
+
+    Only as much of `stream` is read as needed to produce the events consumed, so a
+    caller that stops early leaves the rest undecompressed.
+    """
+    parser = etree.XMLPullParser(events=events, resolve_entities=False)
+    while True:
+        data = stream.read(_CHUNK_SIZE)
+        if not data:
+            break
+        parser.feed(data)
+        for event in parser.read_events():
+            yield event
+    parser.close()
+    for event in parser.read_events():
+        yield event
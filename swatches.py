@@ -0,0 +1,217 @@
+# encoding: utf-8
+
+"""Batch color-space conversion and near-duplicate merging of color swatches.
+
+Works on the swatches of :attr:`PackageReader.graphic`. The whole swatch table is
+converted at once as NumPy arrays, so converting thousands of swatches costs a few
+array operations rather than Python arithmetic per swatch. Conversions use the
+sRGB (D65) definitions and the naive device CMYK formulas. They are meant for
+bulk normalization and matching, not as a substitute for ICC color management.
+
+NumPy is an optional dependency, needed only by this module.
+"""
+
+import re
+
+from pyidml.opc.packuri import PackURI
+from pyidml.opc.serialized import PartSource, parse_part, remap_refs, serialize_part
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+DESIGNMAP_URI = PackURI("/designmap.xml")
+
+SPACES = ("RGB", "CMYK", "LAB")
+
+_RGB_NAME = re.compile(r"^RGB_\d+_\d+_\d+$")
+
+_REFERRING_KINDS = (
+    "Graphic", "Styles", "Preferences", "MasterSpread", "Spread", "Story"
+)
+
+
+def convert_swatches(colors, space, apply=False):
+    """Return dict mapping swatch name to its color value converted to `space`.
+
+    `colors` is a dict of name to `<Color>` element like `reader.graphic.colors`,
+    and `space` one of "RGB", "CMYK" or "LAB". Swatches in other spaces are left
+    out. Values come back as tuples of floats, RGB from 0 to 255, CMYK from 0 to
+    100 and LAB as L, a, b. With `apply`, each swatch's `Space` and `ColorValue` are
+    also rewritten, RGB rounded to whole numbers and the rest to two decimals.
+    """
+    _require_numpy()
+    if space not in SPACES:
+        raise ValueError("space must be one of %s, got %r" % (", ".join(SPACES), space))
+    names, converted = [], []
+    for source_space in SPACES:
+        group = [
+            (name, elm)
+            for name, elm in colors.items()
+            if elm.get("Space") == source_space and elm.get("ColorValue")
+        ]
+        if not group:
+            continue
+        values = np.array(
+            [[float(v) for v in elm.get("ColorValue").split()] for _, elm in group]
+        )
+        if source_space != space:
+            values = _from_rgb(space, _to_rgb(source_space, values))
+        names.extend(name for name, _ in group)
+        converted.append(values)
+        if apply:
+            decimals = 0 if space == "RGB" else 2
+            for (_, elm), row in zip(group, np.round(values, decimals)):
+                elm.set("Space", space)
+                elm.set("ColorValue", " ".join("%g" % v for v in row))
+    if not converted:
+        return {}
+    return dict(zip(names, (tuple(row) for row in np.concatenate(converted).tolist())))
+
+
+def cluster_swatches(colors, threshold=2.3):
+    """Return dict mapping each near-duplicate `RGB_r_g_b` swatch name to its keeper.
+
+    Only RGB swatches named in the `RGB_r_g_b` form are considered. Swatches are
+    taken in `colors` order; each one not yet clustered keeps every later swatch
+    whose CIE76 Delta-E from it is at most `threshold`, 2.3 being about a just
+    noticeable difference. Swatches kept as they are do not appear in the result.
+    """
+    _require_numpy()
+    names = [
+        name
+        for name, elm in colors.items()
+        if _RGB_NAME.match(name) and elm.get("Space") == "RGB" and elm.get("ColorValue")
+    ]
+    if len(names) < 2:
+        return {}
+    rgb = np.array([[float(v) for v in colors[n].get("ColorValue").split()] for n in names])
+    lab = _rgb_to_lab(rgb)
+    unassigned = np.ones(len(names), dtype=bool)
+    keeper_of = {}
+    for i in range(len(names)):
+        if not unassigned[i]:
+            continue
+        unassigned[i] = False
+        candidates = np.flatnonzero(unassigned)
+        if not len(candidates):
+            break
+        distance = np.sqrt(((lab[candidates] - lab[i]) ** 2).sum(axis=1))
+        for j in candidates[distance <= threshold]:
+            keeper_of[names[j]] = names[i]
+            unassigned[j] = False
+    return keeper_of
+
+
+def merge_near_duplicate_swatches(reader, threshold=2.3):
+    """Collapse near-identical `RGB_r_g_b` swatches of `reader` and return the mapping.
+
+    Clusters are found with :func:`cluster_swatches`. The duplicates are removed
+    from Graphic.xml and from the designmap's color groups, and every reference to
+    them in Graphic.xml, Styles.xml, Preferences.xml, spreads, master spreads and
+    stories is rewritten to the kept swatch, in a single pass over each part. A
+    part held as bytes is only parsed when it mentions a removed swatch, and is
+    stored back as bytes.
+    """
+    graphic = reader.graphic
+    keeper_of = cluster_swatches(graphic.colors, threshold)
+    if not keeper_of:
+        return keeper_of
+    remap = {
+        graphic.colors[name].get("Self"): graphic.colors[keeper].get("Self")
+        for name, keeper in keeper_of.items()
+    }
+    for name in keeper_of:
+        graphic.__delcolor__(name)
+        del graphic.colors[name]
+
+    # ---drop the duplicates from their color group rather than list keepers twice---
+    designmap = reader[DESIGNMAP_URI]
+    for elm in list(designmap.iter("ColorGroupSwatch")):
+        if elm.get("SwatchItemRef") in remap:
+            elm.getparent().remove(elm)
+
+    needles = [ref.encode("utf-8") for ref in remap]
+    with PartSource(reader) as source:
+        partnames = source.partnames(*_REFERRING_KINDS)
+    for partname in partnames:
+        if partname not in reader:
+            continue
+        if reader.parts.is_parsed(partname):
+            remap_refs(reader[partname], remap)
+            continue
+        blob = reader.parts.view(partname)
+        if not any(needle in blob for needle in needles):
+            continue
+        root = parse_part(blob)
+        remap_refs(root, remap)
+        reader[partname] = serialize_part(root)
+    return keeper_of
+
+
+def _require_numpy():
+    """Raise |ImportError| with a helpful message when NumPy is not installed."""
+    if np is None:
+        raise ImportError("swatch conversion requires NumPy, install it with 'pip install numpy'")
+
+
+# ---conversions between color spaces, over arrays with one color per row---
+
+_SRGB_TO_XYZ = (
+    (0.4124564, 0.3575761, 0.1804375),
+    (0.2126729, 0.7151522, 0.0721750),
+    (0.0193339, 0.1191920, 0.9503041),
+)
+_D65_WHITE = (0.95047, 1.0, 1.08883)
+_EPSILON = (6.0 / 29) ** 3
+
+
+def _to_rgb(space, values):
+    """Return array of RGB rows, 0 to 255, for `values` in `space`."""
+    if space == "RGB":
+        return values
+    if space == "CMYK":
+        return _cmyk_to_rgb(values)
+    return _lab_to_rgb(values)
+
+
+def _from_rgb(space, rgb):
+    """Return array of rows in `space` for `rgb` rows, 0 to 255."""
+    if space == "RGB":
+        return rgb
+    if space == "CMYK":
+        return _rgb_to_cmyk(rgb)
+    return _rgb_to_lab(rgb)
+
+
+def _rgb_to_cmyk(rgb):
+    rgb = rgb / 255.0
+    k = 1.0 - rgb.max(axis=1)
+    scale = np.where(k < 1.0, 1.0 - k, 1.0)
+    cmy = (1.0 - rgb - k[:, None]) / scale[:, None]
+    return np.column_stack((cmy, k)) * 100.0
+
+
+def _cmyk_to_rgb(cmyk):
+    cmyk = cmyk / 100.0
+    return 255.0 * (1.0 - cmyk[:, :3]) * (1.0 - cmyk[:, 3:4])
+
+
+def _rgb_to_lab(rgb):
+    c = rgb / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ np.array(_SRGB_TO_XYZ).T / np.array(_D65_WHITE)
+    f = np.where(xyz > _EPSILON, np.cbrt(xyz), xyz / (3 * (6.0 / 29) ** 2) + 4.0 / 29)
+    return np.column_stack(
+        (116.0 * f[:, 1] - 16.0, 500.0 * (f[:, 0] - f[:, 1]), 200.0 * (f[:, 1] - f[:, 2]))
+    )
+
+
+def _lab_to_rgb(lab):
+    fy = (lab[:, 0] + 16.0) / 116.0
+    f = np.column_stack((fy + lab[:, 1] / 500.0, fy, fy - lab[:, 2] / 200.0))
+    xyz = np.where(f > 6.0 / 29, f ** 3, 3 * (6.0 / 29) ** 2 * (f - 4.0 / 29))
+    linear = np.clip(xyz * np.array(_D65_WHITE) @ np.linalg.inv(np.array(_SRGB_TO_XYZ)).T, 0, 1)
+    c = np.where(linear <= 0.0031308, 12.92 * linear, 1.055 * linear ** (1 / 2.4) - 0.055)
+    return c * 255.0
@@ -0,0 +1,248 @@
+# encoding: utf-8
+
+"""Index of the fonts a document uses and whether Fonts.xml declares them.
+
+Each part is read in a single streaming pass: Fonts.xml for the declared fonts,
+Styles.xml for the font each paragraph and character style resolves to, then every
+story for the font each character run ends up with.
+"""
+
+from pyidml.opc.serialized import PartSource, iterevents
+from pyidml.opc.packuri import PackURI
+
+
+class FontUsage(object):
+    """Usage of one `(family, style)` font in a document.
+
+    `runs` is a list of `(partname, story_id, index)` triples locating each
+    character run set in this font, `index` counting runs from 0 within the story.
+    `styles` is a list of the `Self` ids of paragraph and character styles that
+    resolve to this font.
+    """
+
+    def __init__(self, family, style, status=None):
+        self.family = family
+        self.style = style
+        self.status = status
+        self.runs = []
+        self.styles = []
+
+    def __repr__(self):
+        return "<FontUsage %r %r runs=%d styles=%d status=%r>" % (
+            self.family,
+            self.style,
+            len(self.runs),
+            len(self.styles),
+            self.status,
+        )
+
+    @property
+    def declared(self):
+        """True when Resources/Fonts.xml has an entry for this family and style."""
+        return self.status is not None
+
+    @property
+    def is_missing(self):
+        """True when the font is undeclared or Fonts.xml reports it not installed."""
+        return self.status != "Installed"
+
+
+class FontUsageIndex(object):
+    """Mapping of `(family, style)` to |FontUsage| for one IDML package.
+
+    Build one with :meth:`from_package`. Fonts declared in Fonts.xml but not used
+    anywhere are included with empty `runs` and `styles`.
+    """
+
+    def __init__(self):
+        self._usages = {}
+        self._declared = {}
+        self._style_fonts = {}
+
+    def __contains__(self, key):
+        return key in self._usages
+
+    def __getitem__(self, key):
+        return self._usages[key]
+
+    def __iter__(self):
+        return iter(self._usages.values())
+
+    def __len__(self):
+        return len(self._usages)
+
+    @classmethod
+    def from_package(cls, pkg):
+        """Return |FontUsageIndex| for `pkg`, a |PackageReader|, path or stream.
+
+        When `pkg` is a path or stream, members are inflated one at a time and never
+        parsed into a full tree.
+        """
+        index = cls()
+        with PartSource(pkg) as source:
+            for partname in source.partnames("Fonts"):
+                index.add_fonts(source[partname])
+            for partname in source.partnames("Styles"):
+                index.add_styles(source[partname])
+            for partname in source.partnames("Story"):
+                index.add_story(partname, source[partname])
+        return index
+
+    @property
+    def missing(self):
+        """List of |FontUsage| in use but undeclared or not installed."""
+        return [u for u in self if u.is_missing and (u.runs or u.styles)]
+
+    def add_fonts(self, part):
+        """Record the fonts declared in Fonts.xml `part`, element or bytes."""
+        streaming = isinstance(part, bytes)
+        for _, elm in iterevents(part):
+            if elm.tag == "Font":
+                key = (elm.get("FontFamily"), elm.get("FontStyleName"))
+                self._declared[key] = self._usage(key).status = elm.get("Status")
+                if streaming:
+                    elm.clear()
+
+    def add_styles(self, part):
+        """Record the font each paragraph and character style in `part` uses.
+
+        A style not setting `AppliedFont` or `FontStyle` inherits it through its
+        `BasedOn` chain, which is resolved once the whole part has been read.
+        Call before :meth:`add_story` so runs can fall back on their styles.
+        """
+        streaming = isinstance(part, bytes)
+        styles = {}
+        current = kind = None
+        for event, elm in iterevents(part, ("start", "end")):
+            tag = elm.tag
+            if tag in ("ParagraphStyle", "CharacterStyle"):
+                if event == "start":
+                    current = styles[elm.get("Self")] = [None, elm.get("FontStyle"), None]
+                    kind = tag
+                    continue
+                current = None
+                if streaming:
+                    elm.clear()
+            elif event == "end" and current is not None:
+                if tag == "AppliedFont":
+                    current[0] = elm.text
+                elif tag == "BasedOn":
+                    # ---a "string" BasedOn names a style of the same kind---
+                    if elm.get("type") == "string":
+                        current[2] = "%s/%s" % (kind, elm.text)
+                    else:
+                        current[2] = elm.text
+
+        for style_id in styles:
+            key = self._resolve_style(styles, style_id)
+            self._style_fonts[style_id] = key
+            if key[0] is not None:
+                self._usage(key).styles.append(style_id)
+
+    def add_story(self, partname, part):
+        """Record the font of each character run in story `part`, element or bytes.
+
+        A run's font comes from its own overrides, then its character style, then
+        the overrides of its enclosing paragraph range and finally its paragraph
+        style, as InDesign resolves them. Ranges nested in table cells resolve
+        against their own enclosing ranges.
+        """
+        partname = PackURI(partname)
+        for story_id, index, spec in iter_run_fonts(part):
+            key = resolve_run_font(spec, self._style_fonts)
+            if key[0] is not None:
+                self._usage(key).runs.append((partname, story_id, index))
+
+    def _resolve_style(self, styles, style_id):
+        """Return `(family, style)` of `style_id`, following its BasedOn chain."""
+        family = font_style = None
+        seen = set()
+        while style_id in styles and style_id not in seen:
+            seen.add(style_id)
+            applied_font, applied_style, based_on = styles[style_id]
+            family = family or applied_font
+            font_style = font_style or applied_style
+            style_id = based_on
+        return family, font_style
+
+    def _usage(self, key):
+        """Return |FontUsage| for `key`, adding it on first reference."""
+        usage = self._usages.get(key)
+        if usage is None:
+            usage = self._usages[key] = FontUsage(key[0], key[1], self._declared.get(key))
+        return usage
+
+
+def iter_run_fonts(part):
+    """Generate `(story_id, index, spec)` for each character run of story `part`.
+
+    `index` counts runs from 0 within the story. `spec` is the tuple
+    `(family, style, character_style, para_family, para_style, paragraph_style)` of
+    the overrides set on the run and on its enclosing paragraph range, to be
+    resolved with :func:`resolve_run_font`. Ranges nested in table cells are
+    described against their own enclosing ranges.
+    """
+    streaming = isinstance(part, bytes)
+    story_id = None
+    index = 0
+    ranges = []
+    for event, elm in iterevents(part, ("start", "end")):
+        tag = elm.tag
+        if event == "start":
+            if tag == "CharacterStyleRange":
+                ranges.append([None, elm.get("FontStyle"), elm.get("AppliedCharacterStyle"), tag])
+            elif tag == "ParagraphStyleRange":
+                ranges.append([None, elm.get("FontStyle"), elm.get("AppliedParagraphStyle"), tag])
+            elif tag == "Story" and story_id is None:
+                story_id = elm.get("Self")
+        elif tag == "AppliedFont":
+            if ranges:
+                ranges[-1][0] = elm.text
+        elif tag == "CharacterStyleRange":
+            run = ranges.pop()
+            para = next(
+                (r for r in reversed(ranges) if r[3] == "ParagraphStyleRange"),
+                [None, None, None, None],
+            )
+            yield story_id, index, (run[0], run[1], run[2], para[0], para[1], para[2])
+            index += 1
+            if streaming:
+                elm.clear()
+        elif tag == "ParagraphStyleRange":
+            ranges.pop()
+            if streaming:
+                elm.clear()
+
+
+def read_declared_fonts(part):
+    """Return dict of `(family, style)` to `Status` for the fonts in Fonts.xml `part`."""
+    index = FontUsageIndex()
+    index.add_fonts(part)
+    return index._declared
+
+
+def read_style_fonts(part):
+    """Return dict of style `Self` id to `(family, style)` for Styles.xml `part`.
+
+    Covers paragraph and character styles, resolved through their `BasedOn` chains.
+    """
+    index = FontUsageIndex()
+    index.add_styles(part)
+    return index._style_fonts
+
+
+def resolve_run_font(spec, style_fonts):
+    """Return effective `(family, style)` of a run described by `spec`.
+
+    A run's font comes from its own overrides, then its character style, then the
+    overrides of its enclosing paragraph range and finally its paragraph style, as
+    InDesign resolves them. Styles are looked up in `style_fonts` as returned by
+    :func:`read_style_fonts`.
+    """
+    family, style, char_style, para_family, para_style, para_style_ref = spec
+    char_font = style_fonts.get(char_style, (None, None))
+    para_font = style_fonts.get(para_style_ref, (None, None))
+    return (
+        family or char_font[0] or para_family or para_font[0],
+        style or char_font[1] or para_style or para_font[1],
+    )
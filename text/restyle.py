@@ -0,0 +1,107 @@
+# encoding: utf-8
+
+"""Bulk remapping of the paragraph and character styles applied to text.
+
+:func:`remap_styles` applies a whole `{old ref: new ref}` mapping to each part in a
+single traversal, rather than searching once per style. Parts the reader holds as
+bytes are first checked for any of the old references as plain bytes, and are
+otherwise parsed, remapped and stored back as bytes, independently of each other,
+which lets them be spread over a process pool.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+from pyidml.opc.packuri import PackURI
+from pyidml.opc.serialized import PartSource, parse_part, serialize_part
+
+STYLES_URI = PackURI("/Resources/Styles.xml")
+
+_STYLE_ATTRS = ("AppliedParagraphStyle", "AppliedCharacterStyle")
+
+
+def remap_styles(reader, mapping, based_on=False, workers=None):
+    """Replace style references in `reader` according to `mapping`; return the count.
+
+    `mapping` maps old to new references in `Self` form, e.g.
+    `{"ParagraphStyle/Body": "ParagraphStyle/Brand%3aBody"}`. Each
+    `AppliedParagraphStyle` and `AppliedCharacterStyle` attribute in the stories is
+    remapped. With `based_on`, Styles.xml is remapped too, both those attributes and
+    the `BasedOn` property of each style. With `workers` greater than 1, parts
+    not yet parsed are remapped in that many processes. Returns the number of
+    references changed.
+    """
+    mapping = dict(mapping)
+    if not mapping:
+        return 0
+    with PartSource(reader) as source:
+        partnames = source.partnames("Story")
+    if based_on and STYLES_URI in reader:
+        partnames.append(STYLES_URI)
+
+    count = 0
+    jobs = []
+    for partname in partnames:
+        if partname not in reader:
+            continue
+        if reader.parts.is_parsed(partname):
+            count += _remap_root(reader[partname], mapping, partname == STYLES_URI)
+        else:
+            jobs.append((partname, reader.parts.view(partname), mapping))
+
+    if workers and workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(_remap_blob, jobs, chunksize=8))
+    else:
+        results = [_remap_blob(job) for job in jobs]
+    for (partname, _, _), (blob, changed) in zip(jobs, results):
+        if changed:
+            reader[partname] = blob
+            count += changed
+    return count
+
+
+def _remap_blob(job):
+    """Return `(blob, count)` for the part of `job` after remapping its styles.
+
+    Module-level so it can be shipped to worker processes. `blob` is |None| when
+    nothing changed.
+    """
+    partname, blob, mapping = job
+    # ---references appear in the XML escaped as attribute values or text---
+    if not any(
+        escape(ref, {'"': "&quot;"}).encode("utf-8") in blob
+        or escape(ref.partition("/")[2]).encode("utf-8") in blob
+        for ref in mapping
+    ):
+        return None, 0
+    root = parse_part(blob)
+    count = _remap_root(root, mapping, partname == STYLES_URI)
+    return (serialize_part(root) if count else None), count
+
+
+def _remap_root(root, mapping, based_on):
+    """Remap style references throughout the tree at `root`; return the count.
+
+    With `based_on`, `root` is Styles.xml and the `BasedOn` property of each style
+    is remapped too. A `BasedOn` of type "string" names a style without its kind
+    prefix, which is taken from the style it belongs to.
+    """
+    count = 0
+    for elm in root.iter():
+        attrib = elm.attrib
+        for name in _STYLE_ATTRS:
+            value = attrib.get(name)
+            if value is not None and value in mapping:
+                attrib[name] = mapping[value]
+                count += 1
+        if based_on and elm.tag == "BasedOn":
+            style = elm.getparent().getparent()
+            ref = elm.text or ""
+            if elm.get("type") == "string":
+                ref = "%s/%s" % (style.tag, ref)
+            if ref in mapping:
+                elm.text = mapping[ref]
+                elm.set("type", "object")
+                count += 1
+    return count
@@ -0,0 +1,57 @@
+# encoding: utf-8
+
+"""Plain-text extraction from story parts."""
+
+from pyidml.opc.serialized import iterevents
+
+
+def iter_paragraph_contents(part):
+    """Generate `(story_id, index, contents)` for each paragraph of story `part`.
+
+    `contents` is a list of `(number, text)` pairs, one for each `<Content>` element
+    of the paragraph, `number` counting `<Content>` elements from 0 in document
+    order within the part, so a caller can find the same element again. `text`
+    includes the text following any processing instruction in the element. See
+    :func:`iter_paragraphs` for how paragraphs are delimited.
+    """
+    streaming = isinstance(part, bytes)
+    story_id = None
+    index = 0
+    number = 0
+    contents = []
+    for event, elm in iterevents(part, ("start", "end")):
+        tag = elm.tag
+        if event == "start":
+            if tag == "Story" and story_id is None:
+                story_id = elm.get("Self")
+            continue
+        if tag == "Content":
+            # ---text after an <?ACE ...?> marker is the marker's tail---
+            contents.append((number, "".join(elm.itertext())))
+            number += 1
+        elif tag == "Br" or tag == "ParagraphStyleRange":
+            if contents or tag == "Br":
+                yield story_id, index, contents
+                index += 1
+                contents = []
+        if streaming and tag in ("CharacterStyleRange", "ParagraphStyleRange"):
+            elm.clear()
+    if contents:
+        yield story_id, index, contents
+
+
+def iter_paragraphs(part):
+    """Generate `(story_id, index, text)` for each paragraph of story `part`.
+
+    `part` is the parsed element or serialized bytes of a Stories/Story_*.xml part;
+    bytes are parsed incrementally. `index` counts paragraphs from 0 within the
+    story. A paragraph ends at a `<Br/>` or at the end of its paragraph style range.
+    Text of tables and notes nested in the story is included where it occurs.
+    """
+    for story_id, index, contents in iter_paragraph_contents(part):
+        yield story_id, index, "".join(text for _, text in contents)
+
+
+def story_text(part):
+    """Return text of story `part` with paragraphs separated by newlines."""
+    return "\n".join(text for _, _, text in iter_paragraphs(part))
@@ -0,0 +1,160 @@
+# encoding: utf-8
+
+"""Round-tripping story text through XLIFF for translation.
+
+:func:`export_xliff` writes one XLIFF `<file>` per story and one translation unit
+per paragraph. Each `<Content>` element of the paragraph becomes an inline marker,
+`<g>` in XLIFF 1.2 or `<pc>` in XLIFF 2.0, whose id gives the element's position in
+the story, so formatting boundaries stay visible to translators.
+:func:`import_xliff` reads the translated targets back and writes each marker's
+text into the `<Content>` element it came from.
+
+Both directions stream. Export reads one story at a time and writes the XLIFF
+incrementally. Import applies each `<file>` as soon as it has been read. Memory use
+therefore stays at about one story tree plus one XLIFF file element.
+"""
+
+from lxml import etree
+
+from pyidml.opc.packuri import PackURI
+from pyidml.opc.serialized import PartSource, serialize_part
+from pyidml.text.storytext import iter_paragraph_contents
+
+XLIFF_NS = {
+    "1.2": "urn:oasis:names:tc:xliff:document:1.2",
+    "2.0": "urn:oasis:names:tc:xliff:document:2.0",
+}
+
+
+def export_xliff(pkg, dst, source_lang="en", target_lang=None, version="1.2"):
+    """Write the story text of `pkg` to `dst` as an XLIFF document.
+
+    `pkg` is a |PackageReader|, or the path or stream of an ``.idml`` file. `dst`
+    is a path or a binary stream. `version` is "1.2" or "2.0". Paragraphs without
+    text are skipped. Returns the number of translation units written.
+    """
+    if version not in XLIFF_NS:
+        raise ValueError("unsupported XLIFF version '%s'" % version)
+    nsuri = XLIFF_NS[version]
+    q = lambda tag: "{%s}%s" % (nsuri, tag)  # noqa: E731
+
+    if version == "1.2":
+        root_attrs = {"version": "1.2"}
+    else:
+        root_attrs = {"version": "2.0", "srcLang": source_lang}
+        if target_lang is not None:
+            root_attrs["trgLang"] = target_lang
+
+    count = 0
+    with PartSource(pkg) as source, etree.xmlfile(dst, encoding="UTF-8") as xf:
+        xf.write_declaration()
+        with xf.element(q("xliff"), root_attrs, nsmap={None: nsuri}):
+            for i, partname in enumerate(source.partnames("Story")):
+                if partname not in source:
+                    continue
+                if version == "1.2":
+                    file_attrs = {
+                        "original": partname.membername,
+                        "source-language": source_lang,
+                        "datatype": "x-idml-story",
+                    }
+                    if target_lang is not None:
+                        file_attrs["target-language"] = target_lang
+                else:
+                    file_attrs = {"id": "f%d" % i, "original": partname.membername}
+                with xf.element(q("file"), file_attrs):
+                    with xf.element(q("body" if version == "1.2" else "group"),
+                                    {} if version == "1.2" else {"id": "g%d" % i}):
+                        count += _write_units(xf, q, version, source[partname])
+                xf.flush()
+    return count
+
+
+def import_xliff(reader, src):
+    """Write translated text from XLIFF document `src` into the stories of `reader`.
+
+    `reader` is a |PackageReader|, and `src` is a path or binary stream of an
+    XLIFF 1.2 or 2.0 document written by :func:`export_xliff`. Units without a
+    target are left alone. A story part that `reader` had not parsed yet is
+    stored back serialized once it has been patched. Returns the number of
+    `<Content>` elements changed.
+    """
+    changed = 0
+    nsuri = None
+    partname, patches = None, {}
+    in_target = False
+    for event, elm in etree.iterparse(src, events=("start", "end"), resolve_entities=False):
+        if nsuri is None:
+            nsuri = etree.QName(elm).namespace
+            if nsuri not in XLIFF_NS.values():
+                raise ValueError("not an XLIFF 1.2 or 2.0 document")
+        tag = etree.QName(elm).localname
+        if event == "start":
+            if tag == "file":
+                partname, patches = PackURI("/" + elm.get("original")), {}
+            elif tag == "target":
+                in_target = True
+            continue
+        if tag in ("g", "pc") and in_target:
+            patches[int(elm.get("id")[1:])] = _inline_text(elm)
+        elif tag == "target":
+            in_target = False
+        elif tag in ("trans-unit", "unit"):
+            elm.clear()
+        elif tag == "file":
+            if partname in reader:
+                changed += _patch_story(reader, partname, patches)
+            elm.clear()
+    return changed
+
+
+def _inline_text(elm):
+    """Return text of inline marker `elm`, nested markup flattened."""
+    return "".join(elm.itertext())
+
+
+def _patch_story(reader, partname, patches):
+    """Set text of the `<Content>` elements numbered in `patches` and return count.
+
+    The text of a `<Content>` includes that following processing instructions in
+    it. The instructions are kept, after the new text.
+    """
+    parsed = reader.parts.is_parsed(partname)
+    root = reader[partname]
+    changed = 0
+    for number, content in enumerate(root.iter("Content")):
+        text = patches.get(number)
+        if text is not None and text != "".join(content.itertext()):
+            content.text = text
+            for child in content:
+                child.tail = None
+            changed += 1
+    if not parsed:
+        reader[partname] = serialize_part(root)
+    return changed
+
+
+def _write_units(xf, q, version, part):
+    """Write a translation unit per non-empty paragraph of story `part`; return count.
+
+    Each unit is small, so it is built as a tree and written whole.
+    """
+    nsmap = {None: etree.QName(q("x")).namespace}
+    count = 0
+    for story_id, index, contents in iter_paragraph_contents(part):
+        if not any(text.strip() for _, text in contents):
+            continue
+        if version == "1.2":
+            unit = etree.Element(q("trans-unit"), nsmap=nsmap, id="p%d" % index, resname=story_id or "")
+            source = etree.SubElement(unit, q("source"))
+            inline = "g"
+        else:
+            unit = etree.Element(q("unit"), nsmap=nsmap, id="p%d" % index, name=story_id or "")
+            source = etree.SubElement(etree.SubElement(unit, q("segment")), q("source"))
+            inline = "pc"
+        for number, text in contents:
+            marker = etree.SubElement(source, q(inline), id="c%d" % number)
+            marker.text = text
+        xf.write(unit)
+        count += 1
+    return count
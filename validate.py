@@ -0,0 +1,145 @@
+# encoding: utf-8
+
+"""Validation of IDML parts against the RELAX NG grammar of the IDML schema.
+
+The schema is not shipped with this package. Adobe publishes it with the IDML SDK
+in compact syntax; lxml reads the XML syntax, so convert it first, e.g. with
+``trang Story.rnc Story.rng``. A |SchemaSet| reads one grammar per part kind
+from a directory, named after the kind as the designmap names it, e.g.
+``Story.rng``, ``Spread.rng`` or ``Graphic.rng``, with ``designmap.rng`` for
+designmap.xml itself. Parts of a kind with no grammar are not validated.
+
+Each grammar is compiled once, on first use, and the compiled validator is kept.
+:func:`validate_package` checks every part and can fan the work out over a
+process pool. Each worker compiles the grammars it needs once and keeps them for
+all its parts. Passing a |SchemaSet| to :meth:`PackageReader.save` validates only
+the parts that may have changed.
+"""
+
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+from pyidml.exceptions import InvalidPackageError
+from pyidml.opc.packuri import PackURI
+from pyidml.opc.serialized import PartSource, parse_part
+
+DESIGNMAP_URI = PackURI("/designmap.xml")
+
+_schemas = None
+
+
+class SchemaViolation(object):
+    """One way part `partname` breaks the schema, at `line` of its XML."""
+
+    def __init__(self, partname, line, message):
+        self.partname = partname
+        self.line = line
+        self.message = message
+
+    def __repr__(self):
+        return "<SchemaViolation %s:%s %s>" % (self.partname, self.line, self.message)
+
+    def __str__(self):
+        return "%s:%s: %s" % (self.partname, self.line, self.message)
+
+
+class SchemaSet(object):
+    """RELAX NG validators for IDML parts, read from the ``.rng`` files in `schema_dir`.
+
+    Instances pickle as just the directory, so they can be sent to worker
+    processes, which compile their own validators.
+    """
+
+    def __init__(self, schema_dir):
+        self.schema_dir = schema_dir
+        self._validators = {}
+
+    def __getstate__(self):
+        return {"schema_dir": self.schema_dir}
+
+    def __setstate__(self, state):
+        self.__init__(state["schema_dir"])
+
+    def check(self, reader, partnames):
+        """Validate `partnames` of `reader`; raise |InvalidPackageError| if any is invalid."""
+        kinds = _part_kinds(reader)
+        violations = []
+        for partname in partnames:
+            kind = kinds.get(partname)
+            if kind is not None:
+                violations.extend(self.validate(kind, partname, reader.parts.view(partname)))
+        if violations:
+            raise InvalidPackageError(violations)
+
+    def validate(self, kind, partname, part):
+        """Return list of |SchemaViolation| for `part` of `kind`, an element or bytes.
+
+        The list is empty when the part is valid or there is no grammar for `kind`.
+        """
+        validator = self.validator(kind)
+        if validator is None:
+            return []
+        root = parse_part(part) if isinstance(part, bytes) else part
+        if validator.validate(root):
+            return []
+        return [
+            SchemaViolation(partname, entry.line, entry.message) for entry in validator.error_log
+        ]
+
+    def validator(self, kind):
+        """Return the compiled |RelaxNG| validator for `kind`, or |None| without a grammar."""
+        if kind not in self._validators:
+            path = os.path.join(self.schema_dir, "%s.rng" % kind)
+            self._validators[kind] = etree.RelaxNG(file=path) if os.path.exists(path) else None
+        return self._validators[kind]
+
+
+def validate_package(reader, schemas, workers=None):
+    """Return list of |SchemaViolation| for all the parts of `reader`.
+
+    `schemas` is a |SchemaSet|. With `workers` greater than 1, parts are
+    validated in that many processes. Each part is serialized, if parsed, and
+    reparsed in its worker.
+    """
+    kinds = _part_kinds(reader)
+    jobs = [
+        (kind, partname)
+        for partname, kind in kinds.items()
+        if partname in reader and schemas.validator(kind) is not None
+    ]
+    if not (workers and workers > 1):
+        violations = []
+        for kind, partname in jobs:
+            violations.extend(schemas.validate(kind, partname, reader.parts.view(partname)))
+        return violations
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(schemas,)) as executor:
+        results = executor.map(
+            _validate_job,
+            ((kind, partname, reader.parts.blob(partname)) for kind, partname in jobs),
+            chunksize=8,
+        )
+        return [violation for result in results for violation in result]
+
+
+def _init_worker(schemas):
+    """Keep the |SchemaSet| shipped to this worker process, compiling as needed."""
+    global _schemas
+    _schemas = schemas
+
+
+def _part_kinds(reader):
+    """Return dict mapping each partname the designmap lists to its kind."""
+    with PartSource(reader) as source:
+        kinds = dict((partname, kind) for kind, partname in source.manifest)
+    kinds[DESIGNMAP_URI] = "designmap"
+    return kinds
+
+
+def _validate_job(job):
+    """Return the |SchemaViolation| list for one part, in a worker process."""
+    kind, partname, blob = job
+    return _schemas.validate(kind, partname, blob)
@@ -0,0 +1,224 @@
+# encoding: utf-8
+
+"""Watching an expanded IDML directory and reprocessing only the parts that change.
+
+|PackageWatcher| learns about changed files from inotify on Linux, or by comparing
+file stats between polls elsewhere. Each changed Story, Spread, MasterSpread or
+resource part is parsed once and handed to the registered processors, and the
+derived indexes kept by the watcher (`Self` ids, story text, swatches) are patched
+for that part alone instead of being rebuilt for the whole document.
+
+Only members the designmap lists are parts. Other files appearing in the watched
+directories, e.g. editor backups such as ``Story_u1.xml.bak``, are ignored; a part
+written before the designmap listing it is picked up when designmap.xml changes.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import posixpath
+import select
+import struct
+import time
+
+from lxml import etree
+
+from pyidml.opc.packuri import PackURI
+from pyidml.opc.serialized import _DirPkgReader, read_manifest
+from pyidml.oxml import parse_xml
+from pyidml.text.storytext import story_text
+
+DESIGNMAP_URI = PackURI("/designmap.xml")
+
+_WATCHED_DIRS = ("", "Stories", "Spreads", "MasterSpreads", "Resources", "XML")
+
+
+class PackageWatcher(object):
+    """Keeps derived indexes of the expanded IDML package at `path` up to date.
+
+    Processors registered with :meth:`register` are called as
+    `processor(kind, partname, root)` for each changed part of a kind they asked
+    for, `root` being |None| when the part was deleted. Call :meth:`poll` from your
+    own loop, or :meth:`run` to block.
+    """
+
+    def __init__(self, path, use_inotify=True):
+        self._path = os.path.abspath(path)
+        self._reader = _DirPkgReader(self._path)
+        self._processors = []
+        self._kinds = {}
+        self.ids = {}
+        self.story_text = {}
+        self.swatches = {}
+        self._part_ids = {}
+        self._source = _InotifySource.open(self._path) if use_inotify else None
+        if self._source is None:
+            self._source = _PollingSource(self._path)
+        self._load_manifest()
+        for partname in list(self._kinds):
+            self._update(partname)
+
+    def close(self):
+        """Stop watching and release the inotify descriptor, if any."""
+        self._source.close()
+
+    def register(self, processor, kinds=("Story", "Spread")):
+        """Call `processor` for every later change to a part of one of `kinds`."""
+        self._processors.append((processor, frozenset(kinds)))
+
+    def poll(self, timeout=0.0):
+        """Process changes seen within `timeout` seconds and return their partnames."""
+        changed = set(PackURI("/" + membername) for membername in self._source.changes(timeout))
+        if DESIGNMAP_URI in changed:
+            changed.update(self._load_manifest())
+        partnames = []
+        for partname in sorted(changed):
+            if partname not in self._kinds:
+                continue
+            self._update(partname, notify=True)
+            partnames.append(partname)
+        return partnames
+
+    def run(self, interval=0.5, stop=None):
+        """Process changes until `stop()` returns True, waiting `interval` between polls."""
+        while stop is None or not stop():
+            self.poll(interval)
+
+    def _load_manifest(self):
+        """Read partname kinds from designmap.xml; return the partnames newly listed."""
+        manifest = read_manifest(self._reader[DESIGNMAP_URI])
+        added = [partname for _, partname in manifest if partname not in self._kinds]
+        self._kinds.update((partname, kind) for kind, partname in manifest)
+        return added
+
+    def _update(self, partname, notify=False):
+        """Re-read part `partname`, patch the indexes and notify processors."""
+        kind = self._kinds[partname]
+        try:
+            root = parse_xml(self._reader[partname])
+        except KeyError:
+            root = None
+        except etree.XMLSyntaxError:
+            # ---caught mid-write; the closing write will report it again---
+            return
+
+        for self_id in self._part_ids.pop(partname, ()):
+            if self.ids.get(self_id) == partname:
+                del self.ids[self_id]
+        self.story_text.pop(partname, None)
+        if kind == "Graphic":
+            self.swatches.clear()
+
+        if root is not None:
+            part_ids = self._part_ids[partname] = []
+            for elm in root.iter():
+                self_id = elm.get("Self")
+                if self_id is not None:
+                    self.ids[self_id] = partname
+                    part_ids.append(self_id)
+            if kind == "Story":
+                self.story_text[partname] = story_text(root)
+            elif kind == "Graphic":
+                self.swatches.update(
+                    (elm.get("Self"), dict(elm.attrib)) for elm in root if elm.get("Self")
+                )
+        else:
+            del self._kinds[partname]
+
+        if notify:
+            for processor, kinds in self._processors:
+                if kind in kinds:
+                    processor(kind, partname, root)
+
+
+class _InotifySource(object):
+    """Reports changed members using the Linux inotify API through libc."""
+
+    _IN_CLOSE_WRITE = 0x00000008
+    _IN_MOVED_TO = 0x00000080
+    _IN_CREATE = 0x00000100
+    _IN_DELETE = 0x00000200
+    _IN_MOVED_FROM = 0x00000040
+    _MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_MOVED_FROM | _IN_CREATE | _IN_DELETE
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, libc, fd, path):
+        self._libc = libc
+        self._fd = fd
+        self._dirs = {}
+        for subdir in _WATCHED_DIRS:
+            full = os.path.join(path, subdir)
+            if os.path.isdir(full):
+                wd = libc.inotify_add_watch(fd, full.encode("utf-8"), self._MASK)
+                if wd >= 0:
+                    self._dirs[wd] = subdir
+
+    @classmethod
+    def open(cls, path):
+        """Return |_InotifySource| watching `path`, or |None| if inotify is unavailable."""
+        libname = ctypes.util.find_library("c")
+        try:
+            libc = ctypes.CDLL(libname, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd, path)
+
+    def changes(self, timeout):
+        """Return set of membernames changed since the last call."""
+        changed = set()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        while ready:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = self._EVENT.unpack_from(data, offset)
+                offset += self._EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0").decode("utf-8")
+                offset += length
+                if wd in self._dirs and name:
+                    changed.add(posixpath.join(self._dirs[wd], name))
+            ready, _, _ = select.select([self._fd], [], [], 0)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingSource(object):
+    """Reports changed members by comparing file stats between calls."""
+
+    def __init__(self, path):
+        self._path = path
+        self._stats = self._snapshot()
+
+    def changes(self, timeout):
+        """Return set of membernames changed since the last call."""
+        if timeout:
+            time.sleep(timeout)
+        stats = self._snapshot()
+        changed = {m for m in stats if self._stats.get(m) != stats[m]}
+        changed |= set(self._stats) - set(stats)
+        self._stats = stats
+        return changed
+
+    def close(self):
+        pass
+
+    def _snapshot(self):
+        """Return dict of membername to `(mtime_ns, size)` of the watched files."""
+        stats = {}
+        for subdir in _WATCHED_DIRS:
+            full = os.path.join(self._path, subdir)
+            if not os.path.isdir(full):
+                continue
+            for entry in os.scandir(full):
+                if entry.is_file():
+                    st = entry.stat()
+                    stats[posixpath.join(subdir, entry.name)] = (st.st_mtime_ns, st.st_size)
+        return stats